@@ -17,14 +17,15 @@ from __future__ import annotations
 """Acquisition functions and builders implementations."""
 
 import abc
-import copy
 import functools
-from typing import Any, Callable, Dict, Generic, Optional, Protocol, Sequence, TypeVar
+from typing import Any, Callable, ClassVar, Dict, Generic, Optional, Protocol, Sequence, TypeVar, Union
 
 import attr
 import jax
+from jax import api_util
 from jax import numpy as jnp
 import numpy as np
+from scipy import spatial
 from tensorflow_probability.substrates import jax as tfp
 from vizier import pyvizier as vz
 from vizier._src.jax import stochastic_process_model as sp
@@ -37,7 +38,113 @@ tfp_bo = tfp.experimental.bayesopt
 tfpke = tfp.experimental.psd_kernels
 
 
+def _pad_to_pow2(arr: types.Array, axis: int = 0) -> jax.Array:
+  """Zero-pads `arr` along `axis` so its size is the next power of two."""
+  size = arr.shape[axis]
+  padded_size = 1 << max(size - 1, 0).bit_length()
+  pad_width = [(0, 0)] * arr.ndim
+  pad_width[axis] = (0, padded_size - size)
+  return jnp.pad(arr, pad_width)
+
+
+def _pad_rows_to_multiple(
+    arr: types.Array, multiple: int, constant_values: Any = 0
+) -> jax.Array:
+  """Pads the leading axis of `arr` to a multiple of `multiple`."""
+  pad_width = [(0, 0)] * arr.ndim
+  pad_width[0] = (0, -arr.shape[0] % multiple)
+  return jnp.pad(arr, pad_width, constant_values=constant_values)
+
+
+def _with_padded_candidates(fn: Callable[..., Any]) -> Callable[..., Any]:
+  """Evaluates `fn` on candidates padded to a power-of-two count.
+
+  Jitted functions are recompiled for every new input shape. When `fn` is
+  called eagerly with a varying number of candidates (e.g. the prior trials
+  scored by the acquisition optimizer), padding the candidates bounds the
+  number of compilations to the logarithm of the largest candidate count.
+  Under an outer trace the shape is already fixed, so no padding is done.
+
+  `fn` must be pointwise in the candidates, with the candidate axis being the
+  last axis of every output.
+
+  If `fn` is jitted, the returned function also has a `precompile(xs, *args)`
+  method, which ahead-of-time compiles `fn` for the padded shapes of `xs` (an
+  ArrayTree of `jax.ShapeDtypeStruct`s or arrays). Matching calls then run the
+  compiled executable without tracing.
+
+  Args:
+    fn: Function whose first argument is an (M, D) array (or an ArrayTree of
+      such arrays).
+
+  Returns:
+    Function with the same signature as `fn`.
+  """
+  compiled_fns = {}
+
+  @functools.wraps(fn)
+  def wrapped(xs, *args, **kwargs):
+    leaves = jax.tree_util.tree_leaves(xs)
+    if any(isinstance(leaf, jax.core.Tracer) for leaf in leaves):
+      return fn(xs, *args, **kwargs)
+    num_candidates = leaves[0].shape[0]
+    padded_xs = jax.tree_util.tree_map(_pad_to_pow2, xs)
+    compiled_fn = None
+    if compiled_fns and not kwargs:
+      # The signature includes the weak types, so that an executable is only
+      # called with the exact input types it was compiled for.
+      compiled_fn = compiled_fns.get(_input_signature(padded_xs, args))
+    outputs = (compiled_fn or fn)(padded_xs, *args, **kwargs)
+    return jax.tree_util.tree_map(lambda y: y[..., :num_candidates], outputs)
+
+  def precompile(xs, *args) -> None:
+    padded_xs = jax.tree_util.tree_map(
+        lambda x: jax.ShapeDtypeStruct(
+            (1 << max(x.shape[0] - 1, 0).bit_length(),) + tuple(x.shape[1:]),
+            x.dtype,
+        ),
+        xs,
+    )
+    compiled_fns[_input_signature(padded_xs, args)] = fn.lower(
+        padded_xs, *args
+    ).compile()
+
+  if hasattr(fn, 'lower'):
+    wrapped.precompile = precompile
+  return wrapped
+
+
+def _input_signature(xs: Any, args: tuple[Any, ...]) -> Any:
+  """Returns a hashable signature of the input types of `xs` and `args`.
+
+  The input types are the abstract values `jax.jit` traces and compiles for,
+  i.e. the shapes, canonical dtypes and weak types of the leaves.
+
+  Args:
+    xs: Candidates, or their `jax.ShapeDtypeStruct`s.
+    args: Other arguments, or their `jax.ShapeDtypeStruct`s.
+
+  Returns:
+    The tree structure and the abstract values of the leaves.
+  """
+  leaves, treedef = jax.tree_util.tree_flatten((xs, args))
+  return treedef, tuple(api_util.shaped_abstractify(leaf) for leaf in leaves)
+
+
 class AcquisitionFunction(Protocol):
+  """Acquisition function of a predictive distribution.
+
+  Attributes:
+    needs_samples: Whether the acquisition needs the exact predictive
+      distribution (e.g. to draw samples from it). If False, only its mean and
+      stddev are used, and the builders may pass a moment-matched Normal.
+    pointwise: Whether the acquisition of each candidate only depends on that
+      candidate. If True, the builders may pad the candidates, whose
+      acquisitions are then discarded.
+  """
+
+  needs_samples: ClassVar[bool] = True
+  pointwise: ClassVar[bool] = False
 
   def __call__(
       self,
@@ -48,10 +155,14 @@ class AcquisitionFunction(Protocol):
     pass
 
 
+@jax.tree_util.register_pytree_node_class
 @attr.define
 class UCB(AcquisitionFunction):
   """UCB AcquisitionFunction."""
 
+  needs_samples: ClassVar[bool] = False
+  pointwise: ClassVar[bool] = True
+
   coefficient: float = attr.field(
       default=1.8, validator=attr.validators.instance_of(float)
   )
@@ -62,14 +173,39 @@ class UCB(AcquisitionFunction):
       features: Optional[types.Array] = None,
       labels: Optional[types.Array] = None,
   ) -> jax.Array:
-    del features, labels
-    return dist.mean() + self.coefficient * dist.stddev()
+    del features
+    return self.from_moments(dist.mean(), dist.stddev(), labels)
+
+  def from_moments(
+      self,
+      mean: jax.Array,
+      stddev: jax.Array,
+      labels: Optional[types.Array] = None,
+  ) -> jax.Array:
+    """Computes the acquisition from the predictive mean and stddev."""
+    del labels
+    return mean + self.coefficient * stddev
+
+  def tree_flatten(self) -> tuple[tuple[Any, ...], None]:
+    return (self.coefficient,), None
+
+  @classmethod
+  def tree_unflatten(cls, aux_data: None, children: tuple[Any, ...]):
+    del aux_data
+    # Bypasses the validators, since the coefficient may be a tracer.
+    acquisition = object.__new__(cls)
+    object.__setattr__(acquisition, 'coefficient', children[0])
+    return acquisition
 
 
+@jax.tree_util.register_pytree_node_class
 @attr.define
 class HyperVolumeScalarization(AcquisitionFunction):
   """HyperVolume Scalarization acquisition function."""
 
+  needs_samples: ClassVar[bool] = False
+  pointwise: ClassVar[bool] = True
+
   coefficient: float = attr.field(
       default=1.0, validator=attr.validators.instance_of(float)
   )
@@ -80,15 +216,40 @@ class HyperVolumeScalarization(AcquisitionFunction):
       features: Optional[types.Array] = None,
       labels: Optional[types.Array] = None,
   ) -> jax.Array:
-    del features, labels
+    del features
+    return self.from_moments(dist.mean(), dist.stddev(), labels)
+
+  def from_moments(
+      self,
+      mean: jax.Array,
+      stddev: jax.Array,
+      labels: Optional[types.Array] = None,
+  ) -> jax.Array:
+    """Computes the acquisition from the predictive mean and stddev."""
+    del labels
     # Uses scalarizations in https://arxiv.org/abs/2006.04655 for
     # non-convex biobjective optimization of mean vs stddev.
-    return jnp.minimum(dist.mean(), self.coefficient * dist.stddev())
+    return jnp.minimum(mean, self.coefficient * stddev)
 
+  def tree_flatten(self) -> tuple[tuple[Any, ...], None]:
+    return (self.coefficient,), None
 
+  @classmethod
+  def tree_unflatten(cls, aux_data: None, children: tuple[Any, ...]):
+    del aux_data
+    # Bypasses the validators, since the coefficient may be a tracer.
+    acquisition = object.__new__(cls)
+    object.__setattr__(acquisition, 'coefficient', children[0])
+    return acquisition
+
+
+@jax.tree_util.register_pytree_node_class
 @attr.define
 class EI(AcquisitionFunction):
 
+  needs_samples: ClassVar[bool] = False
+  pointwise: ClassVar[bool] = True
+
   def __call__(
       self,
       dist: tfd.Distribution,
@@ -96,11 +257,34 @@ class EI(AcquisitionFunction):
       labels: Optional[types.Array] = None,
   ) -> jax.Array:
     del features
-    return tfp_bo.acquisition.GaussianProcessExpectedImprovement(dist, labels)()
+    return self.from_moments(dist.mean(), dist.stddev(), labels)
+
+  def from_moments(
+      self,
+      mean: jax.Array,
+      stddev: jax.Array,
+      labels: Optional[types.Array] = None,
+  ) -> jax.Array:
+    """Computes the acquisition from the predictive mean and stddev."""
+    return tfp_bo.acquisition.GaussianProcessExpectedImprovement(
+        tfd.Normal(mean, stddev), labels
+    )()
+
+  def tree_flatten(self) -> tuple[tuple[Any, ...], None]:
+    return (), None
 
+  @classmethod
+  def tree_unflatten(cls, aux_data: None, children: tuple[Any, ...]):
+    del aux_data, children
+    return cls()
 
+
+@jax.tree_util.register_pytree_node_class
 class PI(AcquisitionFunction):
 
+  needs_samples: ClassVar[bool] = False
+  pointwise: ClassVar[bool] = True
+
   def __call__(
       self,
       dist: tfd.Distribution,
@@ -108,14 +292,128 @@ class PI(AcquisitionFunction):
       labels: Optional[types.Array] = None,
   ) -> jax.Array:
     del features
+    return self.from_moments(dist.mean(), dist.stddev(), labels)
+
+  def from_moments(
+      self,
+      mean: jax.Array,
+      stddev: jax.Array,
+      labels: Optional[types.Array] = None,
+  ) -> jax.Array:
+    """Computes the acquisition from the predictive mean and stddev."""
     return tfp_bo.acquisition.GaussianProcessProbabilityOfImprovement(
-        dist, labels
+        tfd.Normal(mean, stddev), labels
     )()
 
+  def tree_flatten(self) -> tuple[tuple[Any, ...], None]:
+    return (), None
+
+  @classmethod
+  def tree_unflatten(cls, aux_data: None, children: tuple[Any, ...]):
+    del aux_data, children
+    return cls()
+
+
+# Largest dimension supported by `tfp.mcmc.sample_halton_sequence`.
+_MAX_HALTON_DIM = 1000
+
+
+def _qmc_normal_samples(
+    num_samples: int,
+    dim: int,
+    seed: jax.random.KeyArray,
+    dtype: Any,
+    antithetic: bool = True,
+) -> jax.Array:
+  """Returns (num_samples, dim) quasi-random standard normal base samples.
+
+  The samples are randomized Halton points mapped through the inverse normal
+  CDF. If `antithetic`, only half of them are, and the other half are their
+  antithetic mirror images. Both reduce the variance of Monte Carlo estimates
+  compared to iid samples, but mirroring only helps integrands that are not
+  symmetric under negation of the samples. The samples only depend on static
+  shapes and the seed, so they are computed at trace time and become constants
+  of the compiled graph.
+
+  Args:
+    num_samples: Number of samples.
+    dim: Dimension of each sample.
+    seed: Random seed for the Halton randomization.
+    dtype: Dtype of the samples.
+    antithetic: Whether half of the samples mirror the other half.
+
+  Returns:
+    Array of shape (num_samples, dim).
+  """
+  num_base_samples = (num_samples + 1) // 2 if antithetic else num_samples
+  with jax.ensure_compile_time_eval():
+    if dim <= _MAX_HALTON_DIM:
+      uniforms = tfp.mcmc.sample_halton_sequence(
+          dim,
+          num_results=num_base_samples,
+          dtype=dtype,
+          randomized=True,
+          seed=seed,
+      )
+      eps = np.finfo(dtype).eps
+      base_samples = jax.scipy.special.ndtri(jnp.clip(uniforms, eps, 1 - eps))
+    else:
+      base_samples = jax.random.normal(
+          seed, (num_base_samples, dim), dtype=dtype
+      )
+    if not antithetic:
+      return base_samples
+    return jnp.concatenate([base_samples, -base_samples])[:num_samples]
+
+
+def _qmc_sample(
+    dist: tfd.Distribution,
+    num_samples: int,
+    seed: jax.random.KeyArray,
+    antithetic: bool = True,
+) -> Optional[jax.Array]:
+  """Samples `dist` via its reparameterization with quasi-random base samples.
+
+  Args:
+    dist: Predictive distribution over the candidates.
+    num_samples: Number of samples.
+    seed: Random seed.
+    antithetic: Whether half of the base samples mirror the other half.
+
+  Returns:
+    Samples of shape [num_samples] + `dist`'s batch and event shape, or None if
+    `dist` is not a (multivariate) Normal that can be reparameterized.
+  """
+  if isinstance(dist, tfd.GaussianProcess) and not dist.batch_shape:
+    dist = dist.get_marginal_distribution()
+  if isinstance(dist, tfd.Normal):
+    mean = dist.mean()
+    shape = mean.shape
+    base_samples = _qmc_normal_samples(
+        num_samples, int(np.prod(shape)), seed, mean.dtype, antithetic
+    )
+    base_samples = jnp.reshape(base_samples, (num_samples,) + shape)
+    return mean + dist.stddev() * base_samples
+  if (
+      isinstance(dist, tfd.MultivariateNormalLinearOperator)
+      and not dist.batch_shape
+  ):
+    mean = dist.mean()
+    base_samples = _qmc_normal_samples(
+        num_samples, mean.shape[-1], seed, mean.dtype, antithetic
+    )
+    return mean + dist.scale.matvec(base_samples)
+  return None
+
 
 @attr.define
 class QEI(AcquisitionFunction):
-  """Sampling-based batch expected improvement."""
+  """Sampling-based batch expected improvement.
+
+  (Multivariate) Normal predictives are sampled with antithetic quasi-random
+  base samples, which needs fewer samples for the same accuracy. Other
+  distributions are sampled iid.
+  """
 
   num_samples: int = attr.field(default=100)
   seed: Optional[jax.random.KeyArray] = attr.field(default=None)
@@ -128,15 +426,26 @@ class QEI(AcquisitionFunction):
   ) -> jax.Array:
     del features
     seed = self.seed or jax.random.PRNGKey(0)
-    return tfp_bo.acquisition.ParallelExpectedImprovement(
-        dist, labels, seed=seed, num_samples=self.num_samples
-    )()
+    samples = _qmc_sample(dist, self.num_samples, seed)
+    if samples is None:
+      return tfp_bo.acquisition.ParallelExpectedImprovement(
+          dist, labels, seed=seed, num_samples=self.num_samples
+      )()
+    # Same as `ParallelExpectedImprovement` with its default exploration.
+    best_observed = jnp.max(labels, axis=-1)
+    qei = jax.nn.relu(samples - best_observed - 0.01)
+    return jnp.mean(jnp.max(qei, axis=-1), axis=0)
 
 
 @attr.define
 class QUCB(AcquisitionFunction):
   """Sampling-based batch upper confidence bound.
 
+  (Multivariate) Normal predictives are sampled with quasi-random base samples.
+  They are not antithetic: the integrand only depends on the absolute deviation
+  from the mean, so mirrored samples would be exact duplicates. Other
+  distributions are sampled iid.
+
   Attributes:
     coefficient: UCB coefficient. For a Gaussian distribution, note that
       `UCB(coefficient=c)` is equivalent to `QUCB(coefficient=c * sqrt(pi / 2))`
@@ -159,13 +468,340 @@ class QUCB(AcquisitionFunction):
   ) -> jax.Array:
     del features
     seed = self.seed or jax.random.PRNGKey(0)
-    return tfp_bo.acquisition.ParallelUpperConfidenceBound(
-        dist,
-        labels,
-        seed=seed,
-        exploration=self.coefficient,
-        num_samples=self.num_samples,
-    )()
+    samples = _qmc_sample(dist, self.num_samples, seed, antithetic=False)
+    if samples is None:
+      return tfp_bo.acquisition.ParallelUpperConfidenceBound(
+          dist,
+          labels,
+          seed=seed,
+          exploration=self.coefficient,
+          num_samples=self.num_samples,
+      )()
+    # Same as `ParallelUpperConfidenceBound`.
+    mean = dist.mean()
+    qucb = mean + self.coefficient * jnp.abs(samples - mean)
+    return jnp.mean(jnp.max(qucb, axis=-1), axis=0)
+
+
+def _with_device_parallelism(
+    fn: Callable[..., Any], devices: Sequence[jax.Device]
+) -> Callable[..., Any]:
+  """Evaluates `fn(xs, *args)` with the candidates split across `devices`.
+
+  The candidates are padded to a multiple of the number of devices and
+  `jax.pmap`ped, with `args` and all closed-over values replicated. Under an
+  outer trace, `fn` is called directly.
+
+  `fn` must be pointwise in the candidates, with the candidate axis being the
+  last axis of every output.
+
+  Args:
+    fn: Function whose first argument is an (M, D) array (or an ArrayTree of
+      such arrays).
+    devices: Devices to split the candidates across.
+
+  Returns:
+    Function with the same signature as `fn`.
+  """
+  num_devices = len(devices)
+  pmapped_fns = {}
+
+  def _shard(x: types.Array) -> jax.Array:
+    x = _pad_rows_to_multiple(x, num_devices)
+    return jnp.reshape(x, (num_devices, -1) + x.shape[1:])
+
+  def _unshard(y: jax.Array) -> jax.Array:
+    # (num_devices, ..., M / num_devices) -> (..., M)
+    y = jnp.moveaxis(y, 0, -2)
+    return jnp.reshape(y, y.shape[:-2] + (-1,))
+
+  @functools.wraps(fn)
+  def wrapped(xs, *args):
+    leaves = jax.tree_util.tree_leaves(xs)
+    if any(isinstance(leaf, jax.core.Tracer) for leaf in leaves):
+      return fn(xs, *args)
+    if len(args) not in pmapped_fns:
+      pmapped_fns[len(args)] = jax.pmap(
+          fn, in_axes=(0,) + (None,) * len(args), devices=devices
+      )
+    num_candidates = leaves[0].shape[0]
+    outputs = pmapped_fns[len(args)](
+        jax.tree_util.tree_map(_shard, xs), *args
+    )
+    return jax.tree_util.tree_map(
+        lambda y: _unshard(y)[..., :num_candidates], outputs
+    )
+
+  return wrapped
+
+
+def _is_pointwise(acquisition_fn: AcquisitionFunction) -> bool:
+  """Returns whether `acquisition_fn` is computed separately per candidate."""
+  return getattr(acquisition_fn, 'pointwise', False)
+
+
+def _is_pytree(acquisition_fn: AcquisitionFunction) -> bool:
+  """Returns whether `acquisition_fn` is registered as a pytree node."""
+  leaves = jax.tree_util.tree_leaves(acquisition_fn)
+  return not (len(leaves) == 1 and leaves[0] is acquisition_fn)
+
+
+def _needs_samples(acquisition_fn: AcquisitionFunction) -> bool:
+  """Returns whether `acquisition_fn` needs the exact predictive."""
+  return getattr(acquisition_fn, 'needs_samples', True)
+
+
+def _evaluate_acquisitions(
+    acquisition_fns: Sequence[AcquisitionFunction],
+    dist: tfd.Distribution,
+    features: Any,
+    labels: types.Array,
+) -> list[jax.Array]:
+  """Evaluates `acquisition_fns` on `dist`, in order.
+
+  Moment-based acquisition pytrees with the same structure (e.g. several UCBs
+  with different coefficients) have their parameters stacked and are evaluated
+  with a single `vmap`, so that the acquisition is traced once per group rather
+  than once per acquisition. Other acquisitions are evaluated one by one.
+
+  Args:
+    acquisition_fns: Acquisition functions.
+    dist: Predictive distribution.
+    features: Features passed to acquisitions without `from_moments`.
+    labels: Labels.
+
+  Returns:
+    List of acquisition values, one per element of `acquisition_fns`.
+  """
+  # Reads the moments once so that moment-based acquisitions share them.
+  mean, stddev = dist.mean(), dist.stddev()
+  groups: Dict[Any, list[int]] = {}
+  for i, acquisition_fn in enumerate(acquisition_fns):
+    if hasattr(acquisition_fn, 'from_moments') and _is_pytree(acquisition_fn):
+      key = jax.tree_util.tree_structure(acquisition_fn)
+    else:
+      key = i
+    groups.setdefault(key, []).append(i)
+
+  values = [None] * len(acquisition_fns)
+  for indices in groups.values():
+    group = [acquisition_fns[i] for i in indices]
+    if len(group) == 1 or not jax.tree_util.tree_leaves(group[0]):
+      # Parameter-free acquisitions of the same structure are all equal.
+      if hasattr(group[0], 'from_moments'):
+        value = group[0].from_moments(mean, stddev, labels)
+      else:
+        value = group[0](dist, features, labels)
+      for i in indices:
+        values[i] = value
+      continue
+    stacked = jax.tree_util.tree_map(
+        lambda *leaves: jnp.stack(leaves), *group
+    )
+    stacked_values = jax.vmap(
+        lambda fn: fn.from_moments(mean, stddev, labels)
+    )(stacked)
+    for j, i in enumerate(indices):
+      values[i] = stacked_values[j]
+  return values
+
+
+# Tile sizes of the candidate and trusted points in `_min_linf_distance`. Each
+# tile holds (candidates x trusted x dimensions) distances.
+_DISTANCE_CANDIDATE_TILE_SIZE = 512
+_DISTANCE_TRUSTED_TILE_SIZE = 128
+
+
+def _round_down_to_dtype(values: np.ndarray, dtype: Any) -> np.ndarray:
+  """Casts `values` to `dtype`, rounding towards zero instead of to nearest.
+
+  Used for the distance caps, so that a capped distance never exceeds the cap
+  (e.g. the trust radius) after the cast.
+
+  Args:
+    values: Non-negative array.
+    dtype: Target dtype.
+
+  Returns:
+    Array of `dtype`.
+  """
+  rounded = values.astype(dtype)
+  return np.where(
+      rounded.astype(values.dtype) > values,
+      np.nextafter(rounded, np.zeros_like(rounded)),
+      rounded,
+  )
+
+
+def _min_linf_distance(
+    trusted: types.Array,
+    xs: types.Array,
+    *,
+    max_distances: Optional[types.Array] = None,
+    observations_is_missing: Optional[types.Array] = None,
+) -> jax.Array:
+  """Returns the L-inf distances from `xs` to the closest trusted point.
+
+  The distances are computed in tiles so the working set stays cache-resident:
+  the candidates are mapped over in chunks, and for each chunk a `lax.scan`
+  streams tiles of trusted points while keeping a running minimum. The full
+  (M, N, D) tensor is never materialized.
+
+  Dimensions that share a cap (e.g. all one-hot columns capped at the trust
+  radius) are reduced together and capped once, and dimensions capped at zero
+  (e.g. padding) are dropped, which shrinks the reduction over D.
+
+  Args:
+    trusted: (N, D) array of trusted points.
+    xs: (..., D) array of points.
+    max_distances: (D,) numpy array capping the per-dimension distances.
+    observations_is_missing: (N,) boolean array of trusted points to ignore.
+
+  Returns:
+    (...) array of L-inf distances to the closest trusted point.
+  """
+  if max_distances is None:
+    max_distances = np.inf
+  max_distances = np.broadcast_to(max_distances, trusted.shape[-1:])
+  caps = [cap for cap in np.unique(max_distances) if cap > 0]
+  dimension_groups = [np.flatnonzero(max_distances == cap) for cap in caps]
+  if dimension_groups:
+    dimensions = np.concatenate(dimension_groups)
+    trusted = trusted[:, dimensions]
+    xs = xs[..., dimensions]
+  group_bounds = np.cumsum([0] + [len(group) for group in dimension_groups])
+
+  if observations_is_missing is None:
+    observations_is_missing = np.zeros(trusted.shape[:1], dtype=bool)
+  dtype = jnp.result_type(xs, trusted)
+  batch_shape = xs.shape[:-1]
+  xs = jnp.reshape(xs, (-1, xs.shape[-1]))
+  num_candidates = xs.shape[0]
+
+  # Padded trusted points are marked missing, so they never win the minimum.
+  trusted_tile_size = min(_DISTANCE_TRUSTED_TILE_SIZE, max(trusted.shape[0], 1))
+  trusted = _pad_rows_to_multiple(trusted, trusted_tile_size)
+  observations_is_missing = _pad_rows_to_multiple(
+      observations_is_missing, trusted_tile_size, constant_values=True
+  )
+  trusted_tiles = (
+      jnp.reshape(trusted, (-1, trusted_tile_size, trusted.shape[-1])),
+      jnp.reshape(observations_is_missing, (-1, trusted_tile_size)),
+  )
+
+  def _tile_min_linf_distance(xs_tile: jax.Array) -> jax.Array:
+    def _scan_fn(min_distance, trusted_tile):
+      points, is_missing = trusted_tile
+      distances = jnp.abs(xs_tile[:, jnp.newaxis, :] - points)
+      # Single-operand `lax.reduce`s lower to streaming reductions, so neither
+      # reduction materializes its (m, n) input on top of the distances.
+      linf_distance = jnp.zeros(distances.shape[:-1], distances.dtype)
+      for cap, start, stop in zip(caps, group_bounds[:-1], group_bounds[1:]):
+        group_distance = jax.lax.reduce(
+            distances[..., start:stop],
+            np.array(-np.inf, distances.dtype),
+            jax.lax.max,
+            (2,),
+        )
+        if np.isfinite(cap):
+          group_distance = jnp.minimum(
+              group_distance, np.asarray(cap, distances.dtype)
+          )
+        linf_distance = jnp.maximum(linf_distance, group_distance)
+      # Missing points should never be considered.
+      linf_distance = jnp.where(is_missing, np.inf, linf_distance)
+      tile_min_distance = jax.lax.reduce(
+          linf_distance,
+          np.array(np.inf, linf_distance.dtype),
+          jax.lax.min,
+          (1,),
+      )
+      return jnp.minimum(min_distance, tile_min_distance), None
+
+    init = jnp.full(xs_tile.shape[:1], np.inf, dtype=dtype)
+    min_distance, _ = jax.lax.scan(_scan_fn, init, trusted_tiles)
+    return min_distance
+
+  if num_candidates <= _DISTANCE_CANDIDATE_TILE_SIZE:
+    min_distance = _tile_min_linf_distance(xs)
+  else:
+    xs_tiles = jnp.reshape(
+        _pad_rows_to_multiple(xs, _DISTANCE_CANDIDATE_TILE_SIZE),
+        (-1, _DISTANCE_CANDIDATE_TILE_SIZE, xs.shape[-1]),
+    )
+    min_distance = jax.lax.map(_tile_min_linf_distance, xs_tiles)
+    min_distance = jnp.reshape(min_distance, (-1,))[:num_candidates]
+  return jnp.reshape(min_distance, batch_shape)
+
+
+@functools.lru_cache(maxsize=128)
+def _build_max_distances(
+    onehot_dimensions: tuple[int, ...],
+    trust_radius: float,
+    num_padded_dimensions: Optional[int],
+) -> np.ndarray:
+  """Returns the per-dimension distance caps of `TrustRegion`.
+
+  Cached, since repeated builds with the same converter and number of trials
+  need the same caps.
+
+  Args:
+    onehot_dimensions: For each feature, the number of dimensions of its
+      one-hot encoding, or 0 if it is encoded in a single dimension.
+    trust_radius: Trust region radius.
+    num_padded_dimensions: Total number of dimensions including padding, if
+      the features are padded.
+
+  Returns:
+    Read-only (D,) array.
+  """
+  # Cap distances between one-hot encoded features so that they fall within
+  # the trust region radius.
+  max_distances = np.concatenate([
+      np.full(num_dimensions, trust_radius) if num_dimensions else [np.inf]
+      for num_dimensions in onehot_dimensions
+  ] + [np.zeros(0)])
+  if num_padded_dimensions is not None:
+    # These extra dimensions should be ignored.
+    max_distances = np.pad(
+        max_distances, (0, num_padded_dimensions - max_distances.size)
+    )
+  max_distances.setflags(write=False)
+  return max_distances
+
+
+# Minimum number of trusted points for which `TrustRegion` builds a KD-tree.
+_MIN_KDTREE_SIZE = 32
+
+
+@functools.partial(jax.jit, static_argnames=('max_distances',))
+def _jitted_min_linf_distance(
+    trusted: types.Array,
+    xs: types.Array,
+    observations_is_missing: Optional[types.Array],
+    *,
+    max_distances: tuple[float, ...],
+) -> jax.Array:
+  """Jitted `_min_linf_distance` with the distance caps as static arguments.
+
+  The trusted points are an argument rather than a constant, so the compiled
+  kernel is shared by all trust regions with the same shapes and caps.
+
+  Args:
+    trusted: (N, D) array of trusted points.
+    xs: (..., D) array of points.
+    observations_is_missing: (N,) boolean array of trusted points to ignore.
+    max_distances: Per-dimension distance caps.
+
+  Returns:
+    (...) array of L-inf distances to the closest trusted point.
+  """
+  return _min_linf_distance(
+      trusted,
+      xs,
+      max_distances=np.array(max_distances),
+      observations_is_missing=observations_is_missing,
+  )
 
 
 # TODO: Support discretes and categoricals.
@@ -196,6 +832,7 @@ class TrustRegion:
       *,
       feature_is_missing: Optional[types.Array] = None,
       observations_is_missing: Optional[types.Array] = None,
+      distance_dtype: Optional[Any] = None,
   ):
     """Init.
 
@@ -207,29 +844,71 @@ class TrustRegion:
         features are padded for reducing JIT compilations.
       observations_is_missing: Boolean Array of shape (N,), determining which
         observations are padded for reducing JIT compilations.
+      distance_dtype: If set, e.g. to `jnp.bfloat16`, the distances are
+        computed in this (lower-precision) dtype to cut memory traffic. Since
+        the points are in [0, 1], the distances are then accurate up to the
+        dtype's relative precision, which is fine for comparing against the
+        trust radius.
     """
     self._trusted = trusted
     self._dof = len(specs)
     self._trust_radius = self._compute_trust_radius(self._trusted)
     # TODO: Add support for PaddedArrays instead of passing in
     # masks.
-    self._feature_is_missing = feature_is_missing
     self._observations_is_missing = observations_is_missing
 
-    max_distance = []
-    for spec in specs:
-      # Cap distances between one-hot encoded features so that they fall within
-      # the trust region radius.
-      if spec.type is converters.NumpyArraySpecType.ONEHOT_EMBEDDING:
-        max_distance.extend([self._trust_radius] * spec.num_dimensions)
-      else:
-        max_distance.append(np.inf)
+    # Number of dimensions of each one-hot encoded feature, or 0 for features
+    # encoded in a single dimension.
+    onehot_dimensions = tuple(
+        spec.num_dimensions
+        if spec.type is converters.NumpyArraySpecType.ONEHOT_EMBEDDING
+        else 0
+        for spec in specs
+    )
+    max_distances = _build_max_distances(
+        onehot_dimensions,
+        self._trust_radius,
+        None if feature_is_missing is None else feature_is_missing.shape[-1],
+    )
     if feature_is_missing is not None:
-      # These extra dimensions should be ignored.
-      max_distance.extend(
-          [0.0] * (feature_is_missing.shape[-1] - len(max_distance))
-      )
-    self._max_distances = np.array(max_distance)
+      # Padded dimensions are capped at zero, which drops them.
+      max_distances = np.where(feature_is_missing, 0.0, max_distances)
+    self._max_distances = max_distances
+
+    self._distance_dtype = distance_dtype
+    self._distance_trusted = trusted
+    if distance_dtype is not None:
+      self._distance_trusted = jnp.asarray(trusted, dtype=distance_dtype)
+      max_distances = _round_down_to_dtype(max_distances, distance_dtype)
+    # The caps are static arguments of the distance kernel, so they are baked
+    # into it as literals.
+    self._distance_caps = tuple(float(d) for d in max_distances)
+
+    # Without capped (e.g. one-hot) dimensions, the distance is a plain L-inf
+    # nearest-neighbor distance, which a KD-tree answers for eager queries
+    # without scanning every trusted point. Acquisition functions only query
+    # traced points, so the tree is built on the first eager query.
+    self._kdtree = None
+    self._kdtree_dimensions = np.flatnonzero(self._max_distances > 0)
+    self._use_kdtree = bool(
+        distance_dtype is None
+        and trusted.shape[0] >= _MIN_KDTREE_SIZE
+        and self._kdtree_dimensions.size
+        and np.all(self._max_distances[self._kdtree_dimensions] == np.inf)
+        and (
+            observations_is_missing is None
+            or not np.all(observations_is_missing)
+        )
+    )
+
+  def _get_kdtree(self) -> spatial.cKDTree:
+    """Returns the KD-tree of the trusted points, building it if needed."""
+    if self._kdtree is None:
+      points = np.asarray(self._trusted)[:, self._kdtree_dimensions]
+      if self._observations_is_missing is not None:
+        points = points[~np.asarray(self._observations_is_missing)]
+      self._kdtree = spatial.cKDTree(points)
+    return self._kdtree
 
   def _compute_trust_radius(self, trusted: types.Array) -> float:
     """Computes the trust region radius."""
@@ -263,21 +942,21 @@ class TrustRegion:
       (M,) array of floating numbers, L-infinity distances to the nearest
       trusted point.
     """
-    trusted = self._trusted  # (N,D)
-    if self._feature_is_missing is not None:
-      # Mask out padded dimensions
-      trusted = jnp.where(self._feature_is_missing, 0.0, trusted)
-      xs = jnp.where(self._feature_is_missing, jnp.zeros_like(xs), xs)
-    distances = jnp.abs(trusted - xs[..., jnp.newaxis, :])  # (M, N, D)
-    if self._observations_is_missing is not None:
-      # Mask out padded features. We set these distances to infinite since
-      # they should never be considered.
-      distances = jnp.where(
-          self._observations_is_missing[..., jnp.newaxis], np.inf, distances
+    dtype = jnp.result_type(xs, self._trusted)
+    if self._use_kdtree and not isinstance(xs, jax.core.Tracer):
+      distance, _ = self._get_kdtree().query(
+          np.asarray(xs)[..., self._kdtree_dimensions], k=1, p=np.inf
       )
-    distances_bounded = jnp.minimum(distances, self._max_distances)  # (M, N, D)
-    linf_distance = jnp.max(distances_bounded, axis=-1)  # (M, N)
-    return jnp.min(linf_distance, axis=-1)  # (M,)
+      return jnp.asarray(distance, dtype=dtype)
+    if self._distance_dtype is not None:
+      xs = jnp.asarray(xs, dtype=self._distance_dtype)
+    distance = _jitted_min_linf_distance(
+        self._distance_trusted,
+        xs,
+        self._observations_is_missing,
+        max_distances=self._distance_caps,
+    )
+    return distance.astype(dtype)
 
 
 # TODO: Consolidate with TrustRegion and support padding.
@@ -355,16 +1034,72 @@ class TrustRegionWithCategorical:
       trusted point.
     """
     # TODO: Consider accounting for categorical features.
-    distances_cont = jnp.abs(
-        self._trusted.continuous - xs.continuous[..., jnp.newaxis, :]
-    )  # (M, N, D)
-    linf_distance_cont = jnp.max(distances_cont, axis=-1)  # (M, N)
-    return jnp.min(linf_distance_cont, axis=-1)  # (M,)
+    return _jitted_min_linf_distance(
+        self._trusted.continuous,
+        xs.continuous,
+        None,
+        max_distances=(np.inf,) * self._trusted.continuous.shape[-1],
+    )
 
 
 _F = TypeVar('_F', types.Array, types.ContinuousAndCategoricalArray)
 
 
+# Slope, smoothing width and shift (in widths) of the barrier penalizing the
+# acquisition outside of the trust region. The hinge is shifted outward by 2e-5,
+# so that the penalty is below 1e-6 within the trust radius, including at
+# distances capped at exactly the radius (e.g. one-hot features). It is above
+# 300 beyond 5e-5 outside of the trust radius, and grows by 1e7 per unit
+# distance, so the trust region is not noticeably larger than with a hard cut.
+_TRUST_REGION_BARRIER_SLOPE = 1e7
+_TRUST_REGION_BARRIER_WIDTH = 1e-6
+_TRUST_REGION_BARRIER_SHIFT = 20.0
+
+
+def _penalize_outside_trust_region(
+    tr: Union[TrustRegion, TrustRegionWithCategorical],
+    xs: _F,
+    acquisition: jax.Array,
+) -> jax.Array:
+  """Penalizes the acquisition values of `xs` outside of the trust region."""
+  distance = tr.min_linf_distance(xs)
+  # Due to output normalization, acquisition values are far smaller than the
+  # penalty outside of the trust region. The penalty is a smooth hinge in the
+  # distance to the trust region, so gradient-based acquisition optimizers see
+  # no discontinuity at its boundary and are led back into it.
+  return acquisition - (
+      _TRUST_REGION_BARRIER_SLOPE
+      * _TRUST_REGION_BARRIER_WIDTH
+      * jax.nn.softplus(
+          (distance - tr.trust_radius) / _TRUST_REGION_BARRIER_WIDTH
+          - _TRUST_REGION_BARRIER_SHIFT
+      )
+  )
+
+
+def _with_trust_region(
+    acquisition_fn: Callable[[_F], jax.Array],
+    tr: Union[TrustRegion, TrustRegionWithCategorical],
+) -> Callable[[_F], jax.Array]:
+  """Penalizes `acquisition_fn` outside of the trust region.
+
+  Builders install this only when the trust region is active, so that the
+  distance computation is not part of the compiled graph otherwise.
+
+  Args:
+    acquisition_fn: Function of the candidates.
+    tr: Trust region.
+
+  Returns:
+    Function with the same signature as `acquisition_fn`.
+  """
+
+  def wrapped(xs: _F, *args) -> jax.Array:
+    return _penalize_outside_trust_region(tr, xs, acquisition_fn(xs, *args))
+
+  return wrapped
+
+
 class AcquisitionBuilder(abc.ABC, Generic[_F]):
   """Acquisition/prediction builder.
 
@@ -437,8 +1172,48 @@ def _build_predictive_distribution(
     labels: types.Array,
     observations_is_missing: Optional[types.Array] = None,
     use_vmap: bool = True,
-) -> Callable[[types.Array], tfd.Distribution]:
-  """Generates the predictive distribution on array function."""
+) -> Callable[..., tfd.Distribution]:
+  """Generates the predictive distribution on array function.
+
+  The terms that only depend on the observed data (the Cholesky factor of the
+  kernel matrix and the solve against the labels) are constant within a build.
+  If `state` does not already carry them in its 'predictive' collection, they
+  are computed once here and closed over, so each call only pays for the
+  cross-covariance terms of the new `xs`.
+
+  Args:
+    model: The stochastic process model.
+    state: Model state with 'params' and optionally 'predictive' collections.
+    features: Observed features.
+    labels: Observed labels.
+    observations_is_missing: Boolean array describing missing observations.
+    use_vmap: If True, `state` holds an ensemble and the predictive is a
+      uniform mixture over the ensemble members.
+
+  Returns:
+    A function mapping `xs` to the predictive distribution. With
+    `needs_samples=False`, an ensemble is summarized by a Normal with the exact
+    mean and stddev of the mixture, which skips TFP's generic mixture code.
+  """
+  if 'predictive' not in state:
+
+    def _precompute_predictive(params: types.ModelState) -> types.ModelState:
+      _, pp_state = model.apply(
+          {'params': params},
+          features,
+          labels,
+          method=model.precompute_predictive,
+          mutable='predictive',
+          observations_is_missing=observations_is_missing,
+      )
+      return pp_state
+
+    if use_vmap:
+      _precompute_predictive = jax.vmap(_precompute_predictive)
+    state = {
+        **state,
+        **jax.jit(_precompute_predictive)(state['params']),
+    }
 
   def _predict_on_array_one_model(
       state: types.ModelState, *, xs: _F
@@ -453,7 +1228,9 @@ def _build_predictive_distribution(
     )
 
   # Vmaps and combines the predictive distribution over all models.
-  def _get_predictive_dist(xs: _F) -> tfd.Distribution:
+  def _get_predictive_dist(
+      xs: _F, needs_samples: bool = True
+  ) -> tfd.Distribution:
     if not use_vmap:
       return _predict_on_array_one_model(state, xs=xs)
 
@@ -461,10 +1238,17 @@ def _build_predictive_distribution(
       dist = _predict_on_array_one_model(state_, xs=xs)
       return {'mean': dist.mean(), 'stddev': dist.stddev()}  # pytype: disable=attribute-error  # numpy-scalars
 
-    # Returns a dictionary with mean and stddev, of shape [M, N].
+    # Returns a dictionary with mean and stddev, of shape [N, M].
     # M is the size of the parameter ensemble and N is the number of points.
-    pp = jax.vmap(_predict_mean_and_stddev)(state)
-    batched_normal = tfd.Normal(pp['mean'].T, pp['stddev'].T)  # pytype: disable=attribute-error  # numpy-scalars
+    # Stacking the ensemble on the last axis avoids a transpose for the mixture.
+    pp = jax.vmap(_predict_mean_and_stddev, out_axes=-1)(state)
+    if not needs_samples:
+      # Closed-form moments of the equally-weighted mixture.
+      mean = jnp.mean(pp['mean'], axis=-1)
+      deviation = pp['mean'] - mean[..., jnp.newaxis]
+      variance = jnp.mean(pp['stddev'] ** 2 + deviation**2, axis=-1)
+      return tfd.Normal(mean, jnp.sqrt(variance))
+    batched_normal = tfd.Normal(pp['mean'], pp['stddev'])  # pytype: disable=attribute-error  # numpy-scalars
 
     return tfd.MixtureSameFamily(
         tfd.Categorical(logits=jnp.ones(batched_normal.batch_shape[1])),
@@ -501,6 +1285,17 @@ class GPBanditAcquisitionBuilder(AcquisitionBuilder, Generic[_F]):
   # and labels.
   acquisition_fn: AcquisitionFunction = attr.field(factory=UCB, kw_only=True)
   use_trust_region: bool = attr.field(default=True, kw_only=True)
+  # If set (e.g. to `jnp.bfloat16`), trust region distances are computed in
+  # this lower-precision dtype.
+  trust_region_distance_dtype: Optional[Any] = attr.field(
+      default=None, kw_only=True
+  )
+  # Numbers of candidates, e.g. the acquisition optimizer's batch size, for
+  # which `predict_on_array` and `acquisition_on_array` are compiled ahead of
+  # time at the end of `build()`.
+  precompile_num_candidates: Sequence[int] = attr.field(
+      factory=tuple, kw_only=True
+  )
 
   def __attrs_post_init__(self):
     # Perform extra initializations.
@@ -543,10 +1338,10 @@ class GPBanditAcquisitionBuilder(AcquisitionBuilder, Generic[_F]):
 
     @jax.jit
     def predict_on_array(xs: types.Array) -> Dict[str, jax.Array]:
-      dist = self._get_predictive_dist(xs)
+      dist = self._get_predictive_dist(xs, needs_samples=False)
       return {'mean': dist.mean(), 'stddev': dist.stddev()}
 
-    self._predict_on_array = predict_on_array
+    self._predict_on_array = _with_padded_candidates(predict_on_array)
 
     # 'num_samples' affects the array shape and needs to be known during
     # compile-time knowledge. Marking it static with a decorator, JAX re-JITs
@@ -568,32 +1363,49 @@ class GPBanditAcquisitionBuilder(AcquisitionBuilder, Generic[_F]):
             converter.output_specs,
             feature_is_missing=feature_is_missing,
             observations_is_missing=observations_is_missing,
+            distance_dtype=self.trust_region_distance_dtype,
         )
       else:
         self._tr = TrustRegionWithCategorical(features)
 
     # This supports acquisition fns that do arbitrary computations with the
     # input distributions -- e.g. they could take samples or compute quantiles.
-    @jax.jit
-    def acquisition_on_array(xs):
-      dist = self._get_predictive_dist(xs)
-      acquisition = self.acquisition_fn(dist, features, labels)
-      if self.use_trust_region and self._tr.trust_radius < 0.5:
-        distance = self._tr.min_linf_distance(xs)
-        # Due to output normalization, acquisition can't be nearly as
-        # low as -1e12.
-        # We use a bad value that decreases in the distance to trust region
-        # so that acquisition optimizer can follow the gradient and escape
-        # untrusted regions.
-        return jnp.where(
-            distance <= self._tr.trust_radius, acquisition, -1e12 - distance
-        )
-      else:
-        return acquisition
+    def acquisition_on_array(
+        xs: _F, acquisition_fn: AcquisitionFunction
+    ) -> jax.Array:
+      dist = self._get_predictive_dist(
+          xs, needs_samples=_needs_samples(acquisition_fn)
+      )
+      return acquisition_fn(dist, features, labels)
+
+    if self.use_trust_region and self._tr.trust_radius < 0.5:
+      acquisition_on_array = _with_trust_region(acquisition_on_array, self._tr)
 
-    self._acquisition_on_array = acquisition_on_array
+    self._acquisition_on_array = self._jit_with_acquisition_fn(
+        acquisition_on_array
+    )
+
+    # Fuses prediction and acquisition for callers that need both, so that the
+    # predictive distribution is computed once.
+    def predict_and_acquire_on_array(
+        xs: _F, acquisition_fn: AcquisitionFunction
+    ) -> Dict[str, jax.Array]:
+      dist = self._get_predictive_dist(
+          xs, needs_samples=_needs_samples(acquisition_fn)
+      )
+      acquisition = acquisition_fn(dist, features, labels)
+      if self.use_trust_region and self._tr.trust_radius < 0.5:
+        acquisition = _penalize_outside_trust_region(self._tr, xs, acquisition)
+      return {
+          'mean': dist.mean(),
+          'stddev': dist.stddev(),
+          'acquisition': acquisition,
+      }
+
+    self._predict_and_acquire_on_array = self._jit_with_acquisition_fn(
+        predict_and_acquire_on_array
+    )
 
-    acquisition_problem = copy.deepcopy(problem)
     config = vz.MetricsConfig(
         metrics=[
             vz.MetricInformation(
@@ -601,10 +1413,61 @@ class GPBanditAcquisitionBuilder(AcquisitionBuilder, Generic[_F]):
             )
         ]
     )
-    acquisition_problem.metric_information = config
-    self._acquisition_problem = acquisition_problem
+    # The search space is only read, so a shallow copy suffices.
+    self._acquisition_problem = attr.evolve(
+        problem, metric_information=config
+    )
+    for num_candidates in self.precompile_num_candidates:
+      xs = jax.tree_util.tree_map(
+          lambda x, n=num_candidates: jax.ShapeDtypeStruct(
+              (n,) + x.shape[1:], x.dtype
+          ),
+          features,
+      )
+      for fn in (self._predict_on_array, self._acquisition_on_array):
+        if hasattr(fn, 'precompile'):
+          fn.precompile(xs)
     self._built = True
 
+  def _jit_with_acquisition_fn(
+      self, fn: Callable[[_F, AcquisitionFunction], Any]
+  ) -> Callable[[_F], Any]:
+    """Jits `fn(xs, acquisition_fn)` into a function of `xs`.
+
+    Acquisition functions registered as pytrees are passed as jit arguments, so
+    changing their parameters (e.g. the UCB coefficient) after `build()` does
+    not recompile. Other acquisition functions are compile-time constants.
+
+    With multiple devices, eager calls split the candidates across all of
+    them, if the acquisition is pointwise.
+
+    Args:
+      fn: Function of the candidates and the acquisition function.
+
+    Returns:
+      Function of the candidates that uses the current `acquisition_fn`.
+    """
+    if _is_pytree(self.acquisition_fn):
+      fn_of_args = fn
+      get_args = lambda: (self.acquisition_fn,)
+    else:
+      fn_of_args = lambda xs: fn(xs, self.acquisition_fn)
+      get_args = tuple
+    if not _is_pointwise(self.acquisition_fn):
+      # The acquisition may depend on all the candidates (e.g. QEI reduces over
+      # them), so neither padding nor splitting them is possible.
+      jitted_fn = jax.jit(fn_of_args)
+      return lambda xs: jitted_fn(xs, *get_args())
+    if jax.device_count() > 1:
+      compiled_fn = _with_device_parallelism(fn_of_args, jax.devices())
+    else:
+      compiled_fn = jax.jit(fn_of_args)
+    padded_fn = _with_padded_candidates(compiled_fn)
+    fn_of_xs = lambda xs: padded_fn(xs, *get_args())
+    if hasattr(padded_fn, 'precompile'):
+      fn_of_xs.precompile = lambda xs: padded_fn.precompile(xs, *get_args())
+    return fn_of_xs
+
   @property
   def acquisition_problem(self) -> vz.ProblemStatement:
     if not self._built:
@@ -623,6 +1486,15 @@ class GPBanditAcquisitionBuilder(AcquisitionBuilder, Generic[_F]):
       raise ValueError('Acquisition must be built first via build().')
     return self._predict_on_array
 
+  @property
+  def predict_and_acquire_on_array(
+      self,
+  ) -> Callable[[_F], Dict[str, jax.Array]]:
+    """Returns the predictive mean, stddev and acquisition in one call."""
+    if not self._built:
+      raise ValueError('Acquisition must be built first via build().')
+    return self._predict_and_acquire_on_array
+
   @property
   def metadata_dict(self) -> dict[str, Any]:
     if not self._built:
@@ -671,6 +1543,11 @@ class GPBanditMultiAcquisitionBuilder(AcquisitionBuilder, Generic[_F]):
       factory=dict, kw_only=True
   )
   use_trust_region: bool = attr.field(default=True, kw_only=True)
+  # If set (e.g. to `jnp.bfloat16`), trust region distances are computed in
+  # this lower-precision dtype.
+  trust_region_distance_dtype: Optional[Any] = attr.field(
+      default=None, kw_only=True
+  )
 
   def __attrs_post_init__(self):
     # Perform extra initializations.
@@ -716,10 +1593,10 @@ class GPBanditMultiAcquisitionBuilder(AcquisitionBuilder, Generic[_F]):
 
     @jax.jit
     def predict_mean_and_stddev(xs: _F) -> Dict[str, jax.Array]:
-      dist = self._get_predictive_dist(xs)
+      dist = self._get_predictive_dist(xs, needs_samples=False)
       return {'mean': dist.mean(), 'stddev': dist.stddev()}
 
-    self._predict_on_array = predict_mean_and_stddev
+    self._predict_on_array = _with_padded_candidates(predict_mean_and_stddev)
 
     # 'num_samples' affects the array shape and needs to be known during
     # compile-time knowledge. Marking it static with a decorator, JAX re-JITs
@@ -736,7 +1613,11 @@ class GPBanditMultiAcquisitionBuilder(AcquisitionBuilder, Generic[_F]):
     # Define acquisition.
     if self.use_trust_region:
       if isinstance(features, types.Array):
-        self._tr = TrustRegion(features, converter.output_specs)
+        self._tr = TrustRegion(
+            features,
+            converter.output_specs,
+            distance_dtype=self.trust_region_distance_dtype,
+        )
       else:
         raise ValueError(
             f'{type(self)} does not support trust region with continuous and'
@@ -745,32 +1626,29 @@ class GPBanditMultiAcquisitionBuilder(AcquisitionBuilder, Generic[_F]):
 
     # This supports acquisition fns that do arbitrary computations with the
     # input distributions -- e.g. they could take samples or compute quantiles.
-    @jax.jit
     def acquisition_on_array(xs):
-      dist = self._get_predictive_dist(xs)
-      acquisitions = []
-      for acquisition_fn in self.acquisition_fns.values():
-        acquisitions.append(acquisition_fn(dist, features, labels))
-      acquisition = jnp.stack(acquisitions, axis=0)
+      dist = self._get_predictive_dist(
+          xs,
+          needs_samples=any(
+              _needs_samples(fn) for fn in self.acquisition_fns.values()
+          ),
+      )
+      acquisitions = _evaluate_acquisitions(
+          list(self.acquisition_fns.values()), dist, features, labels
+      )
+      return jnp.stack(acquisitions, axis=0)
 
-      if self.use_trust_region and self._tr.trust_radius < 0.5:
-        distance = self._tr.min_linf_distance(xs)
-        # Due to output normalization, acquisition can't be nearly as
-        # low as -1e12.
-        # We use a bad value that decreases in the distance to trust region
-        # so that acquisition optimizer can follow the gradient and escape
-        # untrusted regions.
-        return jnp.where(
-            distance <= self._tr.trust_radius,
-            acquisition,
-            -1e12 - distance,
-        )
-      else:
-        return acquisition
+    acquisition_on_array = jax.jit(
+        _with_trust_region(acquisition_on_array, self._tr)
+        if self.use_trust_region and self._tr.trust_radius < 0.5
+        else acquisition_on_array
+    )
 
-    self._acquisition_on_array = acquisition_on_array
+    if all(_is_pointwise(fn) for fn in self.acquisition_fns.values()):
+      self._acquisition_on_array = _with_padded_candidates(acquisition_on_array)
+    else:
+      self._acquisition_on_array = acquisition_on_array
 
-    acquisition_problem = copy.deepcopy(problem)
     config = vz.MetricsConfig()
     for name in self.acquisition_fns.keys():
       config.append(
@@ -780,8 +1658,10 @@ class GPBanditMultiAcquisitionBuilder(AcquisitionBuilder, Generic[_F]):
           )
       )
 
-    acquisition_problem.metric_information = config
-    self._acquisition_problem = acquisition_problem
+    # The search space is only read, so a shallow copy suffices.
+    self._acquisition_problem = attr.evolve(
+        problem, metric_information=config
+    )
     self._built = True
 
   @property
@@ -69,6 +69,52 @@ class AcquisitionsTest(absltest.TestCase):
         0.46017216,
     )
 
+  def test_coefficient_is_traced(self):
+    num_traces = 0
+
+    @jax.jit
+    def ucb(acq, mean):
+      nonlocal num_traces
+      num_traces += 1
+      return acq(tfd.Normal(mean, 1.0))
+
+    self.assertAlmostEqual(ucb(acquisitions.UCB(2.0), 0.1), 2.1, places=5)
+    self.assertAlmostEqual(ucb(acquisitions.UCB(3.0), 0.1), 3.1, places=5)
+    self.assertEqual(num_traces, 1)
+
+  def test_from_moments(self):
+    mean = jnp.array([0.1, -0.5, 1.2])
+    stddev = jnp.array([1.0, 0.3, 0.01])
+    labels = jnp.array([0.2, -0.1])
+    for acq in [
+        acquisitions.UCB(),
+        acquisitions.HyperVolumeScalarization(),
+        acquisitions.EI(),
+        acquisitions.PI(),
+    ]:
+      np.testing.assert_allclose(
+          acq.from_moments(mean, stddev, labels),
+          acq(tfd.Normal(mean, stddev), labels=labels),
+      )
+
+  def test_evaluate_acquisitions_groups(self):
+    dist = tfd.Normal(jnp.array([0.1, -0.5, 1.2]), jnp.array([1.0, 0.3, 0.01]))
+    labels = jnp.array([0.2, -0.1])
+    acquisition_fns = [
+        acquisitions.UCB(1.0),
+        acquisitions.EI(),
+        acquisitions.UCB(2.0),
+        acquisitions.PI(),
+        acquisitions.UCB(0.5),
+        acquisitions.EI(),
+    ]
+    values = acquisitions._evaluate_acquisitions(
+        acquisition_fns, dist, None, labels
+    )
+    self.assertLen(values, len(acquisition_fns))
+    for acq, value in zip(acquisition_fns, values):
+      np.testing.assert_allclose(value, acq(dist, labels=labels), rtol=1e-6)
+
   def test_qei(self):
     acq = acquisitions.QEI(num_samples=2000)
     batch_shape = [6]
@@ -83,6 +129,31 @@ class AcquisitionsTest(absltest.TestCase):
     np.testing.assert_allclose(qei_single_point, 0.346, atol=1e-2)
     self.assertEmpty(qei_single_point.shape)
 
+  def test_qei_few_samples(self):
+    # Quasi-random antithetic samples are accurate with few samples.
+    acq = acquisitions.QEI(num_samples=64)
+    dist = tfd.Normal(jnp.array([0.1], dtype=jnp.float64), 1)
+    np.testing.assert_allclose(
+        acq(dist, labels=jnp.array([0.2])), 0.346, atol=1e-2
+    )
+
+  def test_antithetic_qmc_normal_samples(self):
+    samples = acquisitions._qmc_normal_samples(
+        10, 3, jax.random.PRNGKey(0), np.float32
+    )
+    self.assertEqual(samples.shape, (10, 3))
+    np.testing.assert_allclose(samples[:5], -samples[5:])
+
+  def test_qmc_normal_samples_not_antithetic(self):
+    samples = acquisitions._qmc_normal_samples(
+        10, 3, jax.random.PRNGKey(0), np.float32, antithetic=False
+    )
+    self.assertEqual(samples.shape, (10, 3))
+    # No sample is the mirror image of another one.
+    self.assertFalse(
+        np.any(np.all(np.isclose(samples[:, None], -samples[None]), axis=-1))
+    )
+
   def test_qucb_shape(self):
     acq = acquisitions.QUCB()
     batch_shape = [6]
@@ -108,6 +179,78 @@ class AcquisitionsTest(absltest.TestCase):
     self.assertEmpty(qucb_single_point.shape)
 
 
+class PaddedCandidatesTest(absltest.TestCase):
+
+  def test_pads_to_power_of_two(self):
+    shapes = []
+
+    def fn(xs):
+      shapes.append(xs.shape)
+      return {'sum': jnp.sum(xs, axis=-1)}
+
+    padded_fn = acquisitions._with_padded_candidates(fn)
+    xs = np.arange(10.0).reshape(5, 2)
+    np.testing.assert_allclose(padded_fn(xs)['sum'], np.sum(xs, axis=-1))
+    self.assertEqual(shapes, [(8, 2)])
+
+  def test_no_padding_under_trace(self):
+    padded_fn = acquisitions._with_padded_candidates(
+        lambda xs: jnp.sum(xs, axis=-1)
+    )
+    jaxpr = jax.make_jaxpr(padded_fn)(np.ones((5, 2)))
+    self.assertEqual(jaxpr.out_avals[0].shape, (5,))
+    self.assertNotIn('pad', str(jaxpr))
+
+  def test_precompile(self):
+    shapes = []
+
+    @jax.jit
+    def fn(xs):
+      shapes.append(xs.shape)
+      return jnp.sum(xs, axis=-1)
+
+    padded_fn = acquisitions._with_padded_candidates(fn)
+    padded_fn.precompile(jax.ShapeDtypeStruct((5, 2), np.float32))
+    self.assertEqual(shapes, [(8, 2)])
+    # Calls with the same padded shape run the executable without tracing.
+    xs = np.arange(12.0, dtype=np.float32).reshape(6, 2)
+    np.testing.assert_allclose(padded_fn(xs), np.sum(xs, axis=-1))
+    self.assertEqual(shapes, [(8, 2)])
+
+  def test_precompile_weak_types(self):
+    shapes = []
+
+    @jax.jit
+    def fn(xs, scale):
+      shapes.append(xs.shape)
+      return scale * jnp.sum(xs, axis=-1)
+
+    padded_fn = acquisitions._with_padded_candidates(fn)
+    padded_fn.precompile(
+        jax.ShapeDtypeStruct((5, 2), np.float32), np.float32(2.0)
+    )
+    self.assertLen(shapes, 1)
+    xs = np.arange(12.0, dtype=np.float32).reshape(6, 2)
+    np.testing.assert_allclose(
+        padded_fn(xs, np.float32(2.0)), 2.0 * np.sum(xs, axis=-1)
+    )
+    self.assertLen(shapes, 1)
+    # A weakly typed scale does not match the executable, so `fn` is traced.
+    np.testing.assert_allclose(padded_fn(xs, 2.0), 2.0 * np.sum(xs, axis=-1))
+    self.assertLen(shapes, 2)
+
+class DeviceParallelismTest(absltest.TestCase):
+
+  def test_splits_candidates(self):
+    fn = acquisitions._with_device_parallelism(
+        lambda xs, scale: {'sum': scale * jnp.sum(xs, axis=-1)}, jax.devices()
+    )
+    xs = np.arange(10.0).reshape(5, 2)
+    np.testing.assert_allclose(
+        fn(xs, 2.0)['sum'], 2.0 * np.sum(xs, axis=-1)
+    )
+
+
 class TrustRegionTest(absltest.TestCase):
 
   def test_trust_region_small(self):
@@ -178,6 +321,126 @@ class TrustRegionTest(absltest.TestCase):
     )
     self.assertAlmostEqual(tr.trust_radius, 0.224, places=3)
 
+  def test_min_linf_distance_tiled(self):
+    rng = np.random.default_rng(0)
+    trusted = rng.uniform(size=(300, 5))
+    xs = rng.uniform(size=(1100, 5))
+    max_distances = np.array([np.inf, 0.1, np.inf, np.inf, 0.0])
+    observations_is_missing = rng.uniform(size=300) < 0.2
+
+    distances = np.minimum(
+        np.abs(xs[:, np.newaxis, :] - trusted), max_distances
+    ).max(axis=-1)
+    distances[:, observations_is_missing] = np.inf
+    np.testing.assert_allclose(
+        acquisitions._min_linf_distance(
+            trusted,
+            xs,
+            max_distances=max_distances,
+            observations_is_missing=observations_is_missing,
+        ),
+        distances.min(axis=-1),
+    )
+
+  def test_trust_region_bfloat16(self):
+    tr = acquisitions.TrustRegion(
+        np.array([
+            [0.0, 0.0, 0.0, 0.0],
+            [1.0, 1.0, 1.0, 1.0],
+        ]),
+        _build_mock_continuous_array_specs(4),
+        distance_dtype=jnp.bfloat16,
+    )
+    xs = np.array([
+        [0.0, 0.2, 0.3, 0.0],
+        [0.9, 0.8, 0.9, 0.9],
+        [1.0, 1.0, 1.0, 1.0],
+    ])
+    distance = tr.min_linf_distance(xs)
+    self.assertEqual(distance.dtype, xs.dtype)
+    np.testing.assert_allclose(distance, [0.3, 0.2, 0.0], rtol=1e-2)
+
+  def test_penalize_outside_trust_region(self):
+    tr = acquisitions.TrustRegion(
+        np.array([
+            [0.0, 0.0, 0.0, 0.0],
+            [1.0, 1.0, 1.0, 1.0],
+        ]),
+        _build_mock_continuous_array_specs(4),
+    )
+    xs = np.array([
+        [0.0, 0.2, 0.3, 0.0],
+        [0.9, 0.8, 0.9, 0.9],
+        [1.0, 1.0, 1.0, 1.0],
+    ])
+    penalized = acquisitions._penalize_outside_trust_region(
+        tr, xs, np.ones(3)
+    )
+    # Only the first point is outside of the trust region.
+    self.assertLess(penalized[0], -300.0)
+    np.testing.assert_allclose(penalized[1:], 1.0, atol=1e-6)
+
+  def test_penalize_just_outside_trust_region(self):
+    tr = acquisitions.TrustRegion(
+        np.zeros((1, 4)), _build_mock_continuous_array_specs(4)
+    )
+    offsets = np.array([-1e-4, 0.0, 1e-4, 1e-3])
+    xs = np.zeros((4, 4))
+    xs[:, 0] = tr.trust_radius + offsets
+    penalized = acquisitions._penalize_outside_trust_region(
+        tr, xs, np.ones(4)
+    )
+    # Points within the trust radius are not penalized, and points only
+    # slightly outside of it are.
+    np.testing.assert_allclose(penalized[:2], 1.0, atol=1e-6)
+    self.assertLess(penalized[2], -300.0)
+    self.assertLess(penalized[3], -5000.0)
+
+  def test_penalize_outside_trust_region_onehot(self):
+    onehot_spec = mock.create_autospec(converters.NumpyArraySpec)
+    onehot_spec.type = converters.NumpyArraySpecType.ONEHOT_EMBEDDING
+    onehot_spec.num_dimensions = 3
+    tr = acquisitions.TrustRegion(
+        np.array([[0.5, 1.0, 0.0, 0.0]]),
+        _build_mock_continuous_array_specs(1) + [onehot_spec],
+    )
+    xs = np.array([
+        [0.5, 0.0, 1.0, 0.0],
+        [0.6, 0.0, 0.0, 1.0],
+        [0.9, 1.0, 0.0, 0.0],
+    ])
+    # One-hot distances are capped at the trust radius, so the first two points
+    # are on the boundary of the trust region and not penalized.
+    np.testing.assert_allclose(
+        tr.min_linf_distance(xs)[0], tr.trust_radius, rtol=1e-6
+    )
+    penalized = acquisitions._penalize_outside_trust_region(
+        tr, xs, np.ones(3)
+    )
+    np.testing.assert_allclose(penalized[:2], 1.0, atol=1e-6)
+    self.assertLess(penalized[2], -300.0)
+
+  def test_trust_region_kdtree(self):
+    rng = np.random.default_rng(0)
+    trusted = rng.uniform(size=(50, 3))
+    observations_is_missing = np.arange(50) >= 45
+    tr = acquisitions.TrustRegion(
+        trusted,
+        _build_mock_continuous_array_specs(3),
+        observations_is_missing=observations_is_missing,
+    )
+    xs = rng.uniform(size=(20, 3))
+    # Traced queries use the distance kernel, and do not build the KD-tree.
+    traced_distance = jax.jit(tr.min_linf_distance)(xs)
+    self.assertIsNone(tr._kdtree)
+    # Eager queries build and use the KD-tree.
+    np.testing.assert_allclose(tr.min_linf_distance(xs), traced_distance)
+    self.assertIsNotNone(tr._kdtree)
+    np.testing.assert_allclose(
+        tr.min_linf_distance(xs),
+        np.abs(xs[:, np.newaxis, :] - trusted[:45]).max(axis=-1).min(axis=-1),
+    )
+
 
 class TrustRegionWithCategoricalTest(absltest.TestCase):
 
@@ -259,6 +522,59 @@ class GPBanditAcquisitionBuilderTest(absltest.TestCase):
     self.assertEqual(samples.shape, (15, 10))
     self.assertEqual(np.sum(np.isnan(samples)), 0)
 
+  def test_pads_only_pointwise_acquisitions(self):
+
+    class Softmax(acquisitions.AcquisitionFunction):
+      """Acquisition depending on all the candidates."""
+
+      def __call__(self, dist, features=None, labels=None):
+        return jax.nn.softmax(dist.mean())
+
+    xs = np.arange(10.0).reshape(5, 2)
+    for acquisition_fn, expected_shape in (
+        (acquisitions.UCB(), (8, 2)),
+        (Softmax(), (5, 2)),
+    ):
+      shapes = []
+
+      def fn(xs, acquisition_fn):
+        shapes.append(xs.shape)
+        return acquisition_fn(tfd.Normal(jnp.sum(xs, axis=-1), 1.0))
+
+      acq_builder = acquisitions.GPBanditAcquisitionBuilder(
+          acquisition_fn=acquisition_fn
+      )
+      acquisition = acq_builder._jit_with_acquisition_fn(fn)(xs)
+      self.assertEqual(shapes, [expected_shape])
+      np.testing.assert_allclose(
+          acquisition, fn(xs, acquisition_fn), rtol=1e-6
+      )
+
+  def test_splits_only_pointwise_acquisitions(self):
+
+    class Softmax(acquisitions.AcquisitionFunction):
+      """Acquisition depending on all the candidates."""
+
+      def __call__(self, dist, features=None, labels=None):
+        return jax.nn.softmax(dist.mean())
+
+    xs = np.arange(10.0).reshape(5, 2)
+    fn = lambda xs, acq: acq(tfd.Normal(jnp.sum(xs, axis=-1), 1.0))
+    for acquisition_fn, is_split in (
+        (acquisitions.UCB(), True),
+        (Softmax(), False),
+    ):
+      acq_builder = acquisitions.GPBanditAcquisitionBuilder(
+          acquisition_fn=acquisition_fn
+      )
+      with mock.patch.object(jax, 'device_count', return_value=2):
+        with mock.patch.object(jax, 'pmap', wraps=jax.pmap) as pmap:
+          acquisition = acq_builder._jit_with_acquisition_fn(fn)(xs)
+      self.assertEqual(pmap.called, is_split)
+      np.testing.assert_allclose(
+          acquisition, fn(xs, acquisition_fn), rtol=1e-6
+      )
+
   def test_categorical_kernel(self, best_n=2):
     # Random key
     key = jax.random.PRNGKey(0)
@@ -339,6 +655,40 @@ class GPBanditAcquisitionBuilderTest(absltest.TestCase):
     self.assertEqual(pred_dict['stddev'], 0.0)
     self.assertEqual(np.sum(np.isnan(acq_builder.acquisition_on_array(xs))), 0)
 
+    # Without the cached intermediates, the builder precomputes them itself.
+    params_only_builder = acquisitions.GPBanditAcquisitionBuilder(
+        use_trust_region=False
+    )
+    params_only_builder.build(
+        problem,
+        model,
+        {'params': best_model_params},
+        features,
+        labels,
+        converter,
+        use_vmap=use_vmap,
+    )
+    np.testing.assert_allclose(
+        params_only_builder.predict_on_array(xs)['mean'],
+        acq_builder.predict_on_array(xs)['mean'],
+        rtol=1e-6,
+    )
+
+    # The fused prediction and acquisition agrees with the separate ones.
+    fused = acq_builder.predict_and_acquire_on_array(xs)
+    np.testing.assert_allclose(
+        fused['mean'], acq_builder.predict_on_array(xs)['mean'], rtol=1e-6
+    )
+    np.testing.assert_allclose(
+        fused['acquisition'], acq_builder.acquisition_on_array(xs), rtol=1e-6
+    )
+
+    # The moment-matched predictive agrees with the exact ensemble mixture.
+    mixture = acq_builder._get_predictive_dist(xs)
+    moments = acq_builder._get_predictive_dist(xs, needs_samples=False)
+    np.testing.assert_allclose(moments.mean(), mixture.mean(), rtol=1e-6)
+    np.testing.assert_allclose(moments.stddev(), mixture.stddev(), rtol=1e-6)
+
 
 if __name__ == '__main__':
   absltest.main()
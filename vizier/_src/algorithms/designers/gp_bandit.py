@@ -403,7 +403,7 @@ class VizierGPBandit(vza.Designer, vza.Predictor):
     logging.info('Best model parameters: %s', best_model_params)
     ard_loss_fn = self._get_loss_fn(loss_fn)
     if self._use_vmap:
-      ard_loss_fn = jax.vmap(ard_loss_fn)
+      ard_loss_fn = tuned_gp_models.batched_loss_fn(ard_loss_fn)
     ard_all_losses = ard_loss_fn(best_model_params)[0]
     logging.info('All losses: %s', ard_all_losses)
     ard_best_loss = ard_all_losses.flatten()[0].item()
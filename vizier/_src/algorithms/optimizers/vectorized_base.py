@@ -18,7 +18,9 @@ from __future__ import annotations
 
 import abc
 import datetime
+import functools
 import logging
+import operator
 from typing import Generic, Optional, Protocol, Sequence, TypeVar, Union
 
 import attr
@@ -37,6 +39,12 @@ ArrayConverter = Union[
 ]
 
 
+@functools.lru_cache(maxsize=128)
+def _prng_key(seed: int) -> jax.Array:
+  """Returns `jax.random.PRNGKey(seed)`, cached across calls."""
+  return jax.random.PRNGKey(seed)
+
+
 @chex.dataclass(frozen=True)
 class VectorizedStrategyResults:
   """Container for a vectorized strategy result."""
@@ -165,7 +173,7 @@ class ParallelArrayScoreFunction(Protocol):
     """
 
 
-@attr.define(kw_only=True)
+@attr.define(kw_only=True, frozen=True)
 class VectorizedOptimizer:
   """Vectorized strategy optimizer.
 
@@ -191,12 +199,22 @@ class VectorizedOptimizer:
     jit_loop: If True, JIT compile the entire optimization loop. Note that in
       this case 'score_fn', which is used within the optimization loop, needs to
       be jittable. The functionality is intended to improve latency.
+    loop_unroll: The number of optimization steps unrolled in each iteration of
+      the compiled loop. Larger values let XLA pipeline consecutive steps at
+      the cost of a longer compilation.
+    best_features_dtype: If set, the dtype in which the features of the best
+      results are stored during the optimization, e.g. `jnp.bfloat16` to halve
+      their memory traffic. The rewards keep their dtype, so the best results
+      are still selected at full precision, but the returned parameters are
+      rounded to the storage precision.
   """
 
   strategy_factory: VectorizedStrategyFactory
   suggestion_batch_size: int = 25
   max_evaluations: int = 75_000
   jit_loop: bool = True
+  loop_unroll: int = 1
+  best_features_dtype: Optional[jnp.dtype] = None
 
   def optimize(
       self,
@@ -239,7 +257,77 @@ class VectorizedOptimizer:
     Returns:
       The best trials found in the optimization.
     """
-    seed = jax.random.PRNGKey(seed or 0)
+    best_results = self._run_optimization(
+        converter,
+        score_fn,
+        count=count,
+        prior_trials=prior_trials,
+        seed=_prng_key(0 if seed is None else seed),
+    )
+    return self._best_candidates(best_results, converter)
+
+  def optimize_many(
+      self,
+      converter: ArrayConverter,
+      score_fn: ArrayScoreFunction,
+      *,
+      seeds: Sequence[int],
+      count: int = 1,
+      prior_trials: Optional[Sequence[vz.Trial]] = None,
+  ) -> list[list[vz.Trial]]:
+    """Runs independent optimizations of the objective function, one per seed.
+
+    The optimizations are batched with `jax.vmap`, so that the strategy and
+    `score_fn` run on all of them at once. This requires the strategy and
+    `score_fn` to be vmappable, and is equivalent to calling `optimize` with
+    each seed.
+
+    Arguments:
+      converter: The converter used to convert Trials to arrays.
+      score_fn: A callback that expects 2D Array with dimensions (batch_size,
+        features_count) and returns a 1D Array (batch_size,).
+      seeds: The seeds of the optimizations.
+      count: The number of suggestions to generate per optimization.
+      prior_trials: Completed trials to be used for knowledge transfer.
+
+    Returns:
+      The best trials found in each optimization, in the order of `seeds`.
+    """
+    best_results = self._run_optimization(
+        converter,
+        score_fn,
+        count=count,
+        prior_trials=prior_trials,
+        seed=jax.vmap(jax.random.PRNGKey)(jnp.asarray(seeds)),
+        batched=True,
+    )
+    return [
+        self._best_candidates(
+            jax.tree_util.tree_map(operator.itemgetter(i), best_results),
+            converter,
+        )
+        for i in range(len(seeds))
+    ]
+
+  def _run_optimization(
+      self,
+      converter: ArrayConverter,
+      score_fn: ArrayScoreFunction,
+      *,
+      count: int,
+      prior_trials: Optional[Sequence[vz.Trial]],
+      seed: jax.Array,
+      batched: bool = False,
+  ) -> VectorizedStrategyResults:
+    """Runs the optimization loop and returns the best results.
+
+    If `batched`, `seed` holds a stack of keys and one optimization is run per
+    key, with `jax.vmap`. The returned best results then have a leading axis.
+    """
+    n_padded_features = converter.to_features([]).shape[-1]
+    if self.jit_loop:
+      # The prior trials and the loop share the same jitted `score_fn`.
+      score_fn = jax.jit(score_fn)
     if prior_trials:
       # Sort the trials by the order they were created.
       prior_trials = sorted(prior_trials, key=lambda x: x.creation_time)
@@ -249,7 +337,10 @@ class VectorizedOptimizer:
       if isinstance(converter, converters.PaddedTrialToArrayConverter):
         # We need to mask out the `NaN` padded trials with zeroes.
         prior_features = prior_features.padded_array
-        prior_features[len(prior_trials) :, ...] = 0.0
+        is_valid = jnp.arange(prior_features.shape[0]) < len(prior_trials)
+        prior_features = jnp.where(
+            is_valid[:, jnp.newaxis], prior_features, 0.0
+        )
 
       prior_rewards = score_fn(prior_features).reshape(-1)
     else:
@@ -260,72 +351,102 @@ class VectorizedOptimizer:
         suggestion_batch_size=self.suggestion_batch_size,
     )
 
-    dimension_is_missing = None
-
+    # The padded dimensions, if any, are the trailing dimensions starting at
+    # 'num_features'.
+    num_features = None
     if isinstance(converter, converters.PaddedTrialToArrayConverter):
       n_features = sum(spec.num_dimensions for spec in converter.output_specs)
-      n_padded_features = converter.to_features([]).shape[-1]
-      dimension_is_missing = np.array(
-          [False] * n_features + [True] * (n_padded_features - n_features)
-      )
+      if n_padded_features > n_features:
+        num_features = n_features
 
-    def _optimization_one_step(_, args):
-      state, best_results, seed = args
-      suggest_seed, update_seed, new_seed = jax.random.split(seed, num=3)
-      new_features = strategy.suggest(state, suggest_seed)
-      # Ensure masking out padded dimensions in new features.
-      if isinstance(converter, converters.PaddedTrialToArrayConverter):
-        new_features = jnp.where(
-            dimension_is_missing, jnp.zeros_like(new_features), new_features
-        )
+    def mask_fn(features: jax.Array) -> jax.Array:
+      # Masks out padded dimensions in new features. The padded dimensions are
+      # a static slice, so no mask array is materialized, and nothing is traced
+      # when there are no padded dimensions.
+      if num_features is None:
+        return features
+      return features.at[..., num_features:].set(0.0)
+
+    num_iterations = self.max_evaluations // self.suggestion_batch_size
+
+    def suggest_and_score(state, seed):
+      new_features = mask_fn(strategy.suggest(state, seed))
       # We assume `score_fn` is aware of padded dimensions.
-      new_rewards = score_fn(new_features)
+      return new_features, score_fn(new_features)
+
+    def _optimization_one_step(args, seeds):
+      state, best_results = args
+      suggest_seed, update_seed = seeds
+      new_features, new_rewards = suggest_and_score(state, suggest_seed)
       new_state = strategy.update(state, new_features, new_rewards, update_seed)
+      # The best results are tracked with float32 rewards.
       new_best_results = self._update_best_results(
-          best_results, count, new_features, new_rewards
+          best_results, count, new_features, new_rewards.astype(jnp.float32)
       )
-      return new_state, new_best_results, new_seed
+      return new_state, new_best_results
 
-    def _optimize():
+    def _init(seed):
       init_seed, loop_seed = jax.random.split(seed)
-      init_best_results = VectorizedStrategyResults(
-          rewards=-jnp.inf * jnp.ones([count]),
-          features=jnp.zeros([count, converter.to_features([]).shape[-1]]),
-      )
-      init_args = (
-          strategy.init_state(
-              init_seed,
-              prior_features=prior_features,
-              prior_rewards=prior_rewards,
-          ),
-          init_best_results,
-          loop_seed,
+      # The suggest and update seeds of all the iterations are split at once.
+      loop_seeds = jax.random.split(loop_seed, num=2 * num_iterations)
+      loop_seeds = loop_seeds.reshape(num_iterations, 2, *loop_seeds.shape[1:])
+      init_state = strategy.init_state(
+          init_seed,
+          prior_features=prior_features,
+          prior_rewards=prior_rewards,
       )
-      return jax.lax.fori_loop(
-          0,
-          self.max_evaluations // self.suggestion_batch_size,
-          _optimization_one_step,
+      return init_state, loop_seeds
+
+    def _optimize(init_args, loop_seeds):
+      outputs, _ = jax.lax.scan(
+          lambda args, seeds: (_optimization_one_step(args, seeds), None),
           init_args,
+          xs=loop_seeds,
+          unroll=self.loop_unroll,
+      )
+      return outputs
+
+    if batched:
+      _init = jax.vmap(_init)  # pylint: disable=invalid-name
+      # The initial best results are shared by all optimizations.
+      _optimize = jax.vmap(  # pylint: disable=invalid-name
+          _optimize, in_axes=((0, None), 0)
       )
 
     if self.jit_loop:
-      _optimize = jax.jit(_optimize)  # pylint: disable=invalid-name
+      _init = jax.jit(_init)  # pylint: disable=invalid-name
+      # The loop carry is donated so that XLA can reuse its buffers. The CPU
+      # backend does not support donation and would warn about it.
+      _optimize = jax.jit(  # pylint: disable=invalid-name
+          _optimize,
+          donate_argnums=() if jax.default_backend() == 'cpu' else (0, 1),
+      )
 
     start_time = datetime.datetime.now()
-    _, best_results, _ = _optimize()
+    # The initial best results are built outside of the traced functions, so
+    # that 'count' only enters them through the shapes of their arguments.
+    # They are built with numpy to avoid dispatching jax ops for constants. The
+    # features are in jax's default float dtype.
+    float_dtype = jax.dtypes.canonicalize_dtype(np.float64)
+    init_best_results = VectorizedStrategyResults(
+        rewards=np.full([count], -np.inf, dtype=np.float32),
+        features=np.zeros(
+            [count, n_padded_features],
+            dtype=self.best_features_dtype or float_dtype,
+        ),
+    )
+    init_state, loop_seeds = _init(seed)
+    _, best_results = _optimize((init_state, init_best_results), loop_seeds)
     logging.info(
         (
             'Optimization completed. Duration: %s. Evaluations: %s. Best'
             ' Results: %s'
         ),
         datetime.datetime.now() - start_time,
-        (
-            (self.max_evaluations // self.suggestion_batch_size)
-            * self.suggestion_batch_size
-        ),
+        num_iterations * self.suggestion_batch_size,
         best_results,
     )
-    return self._best_candidates(best_results, converter)
+    return best_results
 
   def _update_best_results(
       self,
@@ -336,12 +457,14 @@ class VectorizedOptimizer:
   ) -> VectorizedStrategyResults:
     """Update the best results the optimizer seen thus far.
 
-    The best results are kept in a heap to efficiently maintain the top 'count'
-    results throughout the optimizer run.
+    The best results are kept sorted by decreasing reward. Each call selects
+    the top candidates of the batch with `jax.lax.top_k` and merges them with
+    the best results, so that only O(count) rewards and features are moved.
+    NaN rewards are treated as -inf.
 
     Arguments:
-      best_results: A heap storing the best results seen thus far. Implemented
-        as a list of maximum size of 'count'.
+      best_results: The best results seen thus far, with 'count' entries
+        sorted by decreasing reward.
       count: The number of best results to store.
       batch_features: The current suggested features batch array with a
         dimension of (batch_size, feature_dim).
@@ -349,17 +472,53 @@ class VectorizedOptimizer:
         (batch_size,).
 
     Returns:
-      trials:
+      The best 'count' results, sorted by decreasing reward.
     """
-    all_rewards = jnp.concatenate([batch_rewards, best_results.rewards], axis=0)
-    all_features = jnp.concatenate(
-        [batch_features, best_results.features], axis=0
+    # NaN rewards are not ordered: argmax would select them, and they would
+    # break the merge below, leaving some slots unset.
+    batch_rewards = jnp.where(jnp.isnan(batch_rewards), -jnp.inf, batch_rewards)
+    if count == 1:
+      # A single reduction suffices to keep the best result.
+      i = jnp.argmax(batch_rewards)
+      is_better = batch_rewards[i] >= best_results.rewards[0]
+      return VectorizedStrategyResults(
+          rewards=jnp.where(
+              is_better, batch_rewards[i], best_results.rewards[0]
+          )[jnp.newaxis].astype(best_results.rewards.dtype),
+          features=jnp.where(
+              is_better,
+              batch_features[i].astype(best_results.features.dtype),
+              best_results.features[0],
+          )[jnp.newaxis],
+      )
+    k = min(count, batch_rewards.shape[0])
+    batch_top_rewards, batch_top_indices = jax.lax.top_k(batch_rewards, k)
+    batch_top_features = jnp.take(batch_features, batch_top_indices, axis=0)
+    batch_top_features = batch_top_features.astype(best_results.features.dtype)
+    # Merges the two sorted arrays: the position of an element in the merged
+    # array is its own index plus its rank in the other array. Ties are broken
+    # in favor of the batch, and positions past 'count' are dropped.
+    batch_positions = jnp.arange(k) + jnp.searchsorted(
+        -best_results.rewards, -batch_top_rewards, side='left'
     )
-    top_indices = jnp.argpartition(-all_rewards, count - 1)[:count]
-    return VectorizedStrategyResults(
-        rewards=all_rewards[top_indices],
-        features=all_features[top_indices],
+    best_positions = jnp.arange(count) + jnp.searchsorted(
+        -batch_top_rewards, -best_results.rewards, side='right'
     )
+    rewards = (
+        jnp.empty_like(best_results.rewards)
+        .at[batch_positions]
+        .set(batch_top_rewards, mode='drop')
+        .at[best_positions]
+        .set(best_results.rewards, mode='drop')
+    )
+    features = (
+        jnp.empty_like(best_results.features)
+        .at[batch_positions]
+        .set(batch_top_features, mode='drop')
+        .at[best_positions]
+        .set(best_results.features, mode='drop')
+    )
+    return VectorizedStrategyResults(rewards=rewards, features=features)
 
   def _best_candidates(
       self,
@@ -367,22 +526,24 @@ class VectorizedOptimizer:
       converter: ArrayConverter,
   ) -> list[vz.Trial]:
     """Returns the best candidate trials in the original search space."""
+    # Sorts the rewards on the host and converts all the features at once.
+    # The features are kept in their array type so that the conversion runs
+    # at their precision.
+    rewards = np.asarray(jax.device_get(best_results.rewards))
+    sorted_ind = np.argsort(-rewards, kind='stable')
+    rewards, features = rewards[sorted_ind], best_results.features[sorted_ind]
+    if self.best_features_dtype is not None:
+      features = features.astype(jnp.float32)
     trials = []
-    sorted_ind = jnp.argsort(-best_results.rewards)
-    for i in range(len(best_results.rewards)):
-      # Create trials and convert the strategy features back to parameters.
-      ind = sorted_ind[i]
-      trial = vz.Trial(
-          parameters=converter.to_parameters(
-              jnp.expand_dims(best_results.features[ind], axis=0)
-          )[0]
-      )
-      trial.complete(vz.Measurement({'acquisition': best_results.rewards[ind]}))
+    # Create trials and convert the strategy features back to parameters.
+    for parameters, reward in zip(converter.to_parameters(features), rewards):
+      trial = vz.Trial(parameters=parameters)
+      trial.complete(vz.Measurement({'acquisition': float(reward)}))
       trials.append(trial)
     return trials
 
 
-@attr.define
+@attr.define(frozen=True)
 class VectorizedOptimizerFactory:
   """Vectorized strategy optimizer factory."""
 
@@ -21,7 +21,9 @@ from typing import Optional
 import chex
 import jax
 from jax import numpy as jnp
+import numpy as np
 from vizier import pyvizier as vz
+from vizier._src.algorithms.optimizers import eagle_strategy
 from vizier._src.algorithms.optimizers import vectorized_base as vb
 from vizier._src.jax import types
 from vizier.pyvizier import converters
@@ -220,6 +222,146 @@ class VectorizedBaseTest(parameterized.TestCase):
         -((0.4 - 0.52) ** 2),
     )
 
+  def test_loop_unroll(self):
+    problem = vz.ProblemStatement()
+    problem.search_space.root.add_float_param('f1', 0.0, 1.0)
+    problem.search_space.root.add_float_param('f2', 0.0, 1.0)
+    converter = converters.TrialToArrayConverter.from_study_config(problem)
+    score_fn = lambda x: -jnp.max(jnp.square(x - 0.52), axis=-1)
+    best_candidates = []
+    for loop_unroll in (1, 3):
+      optimizer = vb.VectorizedOptimizer(
+          strategy_factory=fake_increment_strategy_factory,
+          suggestion_batch_size=5,
+          max_evaluations=20,
+          loop_unroll=loop_unroll,
+      )
+      best_candidates.append(
+          optimizer.optimize(converter=converter, score_fn=score_fn, count=3)
+      )
+    self.assertEqual(
+        [t.parameters for t in best_candidates[0]],
+        [t.parameters for t in best_candidates[1]],
+    )
+
+  def test_best_features_dtype(self):
+    problem = vz.ProblemStatement()
+    problem.search_space.root.add_float_param('f1', 0.0, 1.0)
+    problem.search_space.root.add_float_param('f2', 0.0, 1.0)
+    converter = converters.TrialToArrayConverter.from_study_config(problem)
+    score_fn = lambda x: -jnp.max(jnp.square(x - 0.52), axis=-1)
+    optimizer = vb.VectorizedOptimizer(
+        strategy_factory=fake_increment_strategy_factory,
+        suggestion_batch_size=5,
+        max_evaluations=10,
+        best_features_dtype=jnp.bfloat16,
+    )
+    best_candidates = optimizer.optimize(
+        converter=converter, score_fn=score_fn, count=3
+    )
+    for candidate, expected in zip(best_candidates, [0.5, 0.6, 0.4]):
+      self.assertAlmostEqual(
+          candidate.parameters['f1'].value, expected, delta=1e-2
+      )
+
+  def test_optimize_many(self):
+    problem = vz.ProblemStatement()
+    problem.search_space.root.add_float_param('f1', 0.0, 1.0)
+    problem.search_space.root.add_float_param('f2', 0.0, 1.0)
+    converter = converters.TrialToArrayConverter.from_study_config(problem)
+    score_fn = lambda x: -jnp.max(jnp.square(x - 0.52), axis=-1)
+    optimizer = vb.VectorizedOptimizer(
+        strategy_factory=eagle_strategy.VectorizedEagleStrategyFactory(),
+        max_evaluations=500,
+    )
+    seeds = [0, 3, 7]
+    best_candidates = optimizer.optimize_many(
+        converter, score_fn, seeds=seeds, count=2
+    )
+    self.assertLen(best_candidates, len(seeds))
+    for seed, candidates in zip(seeds, best_candidates):
+      expected = optimizer.optimize(converter, score_fn, count=2, seed=seed)
+      for candidate, expected_candidate in zip(candidates, expected):
+        for name in ('f1', 'f2'):
+          self.assertAlmostEqual(
+              candidate.parameters[name].value,
+              expected_candidate.parameters[name].value,
+              places=5,
+          )
+
+  def test_update_best_results(self):
+    optimizer = vb.VectorizedOptimizer(
+        strategy_factory=fake_increment_strategy_factory
+    )
+    best_results = vb.VectorizedStrategyResults(
+        rewards=jnp.array([4.0, 2.0, 0.0]),
+        features=jnp.array([[4.0, 4.0], [2.0, 2.0], [0.0, 0.0]]),
+    )
+    batch_rewards = jnp.array([1.0, 5.0, -1.0, 3.0])
+    new_best_results = optimizer._update_best_results(
+        best_results, 3, jnp.stack([batch_rewards] * 2, axis=-1), batch_rewards
+    )
+    np.testing.assert_array_equal(new_best_results.rewards, [5.0, 4.0, 3.0])
+    np.testing.assert_array_equal(
+        new_best_results.features, [[5.0, 5.0], [4.0, 4.0], [3.0, 3.0]]
+    )
+    # The batch is smaller than the number of best results.
+    batch_rewards = jnp.array([3.0, -1.0])
+    new_best_results = optimizer._update_best_results(
+        best_results, 3, jnp.stack([batch_rewards] * 2, axis=-1), batch_rewards
+    )
+    np.testing.assert_array_equal(new_best_results.rewards, [4.0, 3.0, 2.0])
+    np.testing.assert_array_equal(
+        new_best_results.features, [[4.0, 4.0], [3.0, 3.0], [2.0, 2.0]]
+    )
+
+  def test_update_best_results_nan_rewards(self):
+    optimizer = vb.VectorizedOptimizer(
+        strategy_factory=fake_increment_strategy_factory
+    )
+    best_results = vb.VectorizedStrategyResults(
+        rewards=jnp.full([3], -jnp.inf), features=jnp.zeros([3, 2])
+    )
+    batch_rewards = jnp.array([1.0, jnp.nan, 3.0, 2.0])
+    new_best_results = optimizer._update_best_results(
+        best_results, 3, jnp.stack([batch_rewards] * 2, axis=-1), batch_rewards
+    )
+    np.testing.assert_array_equal(new_best_results.rewards, [3.0, 2.0, 1.0])
+    np.testing.assert_array_equal(
+        new_best_results.features, [[3.0, 3.0], [2.0, 2.0], [1.0, 1.0]]
+    )
+    # A single reduction is used to keep a single best result.
+    new_best_results = optimizer._update_best_results(
+        vb.VectorizedStrategyResults(
+            rewards=jnp.array([-jnp.inf]), features=jnp.zeros([1, 2])
+        ),
+        1,
+        jnp.stack([batch_rewards] * 2, axis=-1),
+        batch_rewards,
+    )
+    np.testing.assert_array_equal(new_best_results.rewards, [3.0])
+    np.testing.assert_array_equal(new_best_results.features, [[3.0, 3.0]])
+
+  def test_update_best_results_count_is_1(self):
+    optimizer = vb.VectorizedOptimizer(
+        strategy_factory=fake_increment_strategy_factory
+    )
+    best_results = vb.VectorizedStrategyResults(
+        rewards=jnp.array([4.0]), features=jnp.array([[4.0, 4.0]])
+    )
+    for batch_rewards, expected in (([1.0, 5.0, -1.0], 5.0), ([3.0], 4.0)):
+      batch_rewards = jnp.array(batch_rewards)
+      new_best_results = optimizer._update_best_results(
+          best_results,
+          1,
+          jnp.stack([batch_rewards] * 2, axis=-1),
+          batch_rewards,
+      )
+      np.testing.assert_array_equal(new_best_results.rewards, [expected])
+      np.testing.assert_array_equal(
+          new_best_results.features, [[expected, expected]]
+      )
+
   def test_vectorized_optimizer_factory(self):
     optimizer_factory = vb.VectorizedOptimizerFactory(
         strategy_factory=fake_increment_strategy_factory
@@ -18,7 +18,7 @@ from __future__ import annotations
 
 import abc
 import json
-from typing import Optional
+from typing import Callable, Optional
 
 import attr
 import numpy as np
@@ -36,6 +36,11 @@ from vizier.utils import json_utils
 BBOB_FACTORY_KEY = 'bbob_factory'
 SINGLE_OBJECTIVE_FACTORY_KEY = 'single_objective_factory'
 
+# Wraps an experimenter, given the seed passed to the factory.
+_ExperimenterWrapper = Callable[
+    [experimenter.Experimenter, Optional[int]], experimenter.Experimenter
+]
+
 
 class ExperimenterFactory(abc.ABC):
   """Abstraction for creating Experimenters."""
@@ -64,12 +69,29 @@ class BBOBExperimenterFactory(SerializableExperimenterFactory):
       default=1,
       validator=[attr.validators.instance_of(int), attr.validators.gt(0)],
   )
+  # The BBOB function resolved from `name`, and the name it was resolved from.
+  _bbob_function: Optional[Callable[[np.ndarray], float]] = attr.field(
+      init=False, default=None, eq=False, repr=False
+  )
+  _bbob_function_name: Optional[str] = attr.field(
+      init=False, default=None, eq=False, repr=False
+  )
+
+  def __attrs_post_init__(self):
+    self._resolve_bbob_function()
+
+  def _resolve_bbob_function(self) -> Optional[Callable[[np.ndarray], float]]:
+    """Returns the BBOB function named `name`, or None if there is none."""
+    if self._bbob_function_name != self.name:
+      self._bbob_function = getattr(bbob, self.name, None)
+      self._bbob_function_name = self.name
+    return self._bbob_function
 
   def __call__(
       self, seed: Optional[int] = None
   ) -> numpy_experimenter.NumpyExperimenter:
     del seed
-    bbob_function = getattr(bbob, self.name, None)
+    bbob_function = self._resolve_bbob_function()
     if bbob_function is None:
       raise ValueError(f'{self.name} is not a valid BBOB function in bbob.py')
     return numpy_experimenter.NumpyExperimenter(
@@ -111,16 +133,36 @@ class SingleObjectiveExperimenterFactory(SerializableExperimenterFactory):
   # points to categorize to. See discrete_dict.
   categorical_dict: dict[int, int] = attr.field(default=attr.Factory(dict))
 
+  # The wrappers applied to the base experimenter, built on the first call.
+  _wrappers: Optional[list[_ExperimenterWrapper]] = attr.field(
+      init=False, default=None, eq=False, repr=False
+  )
+
   def __call__(self, seed: Optional[int] = None) -> experimenter.Experimenter:
     """Creates the SingleObjective Experimenter."""
     exptr = self.base_factory()
+    if self._wrappers is None:
+      self._wrappers = self._build_wrappers(exptr)
+    for wrapper in self._wrappers:
+      exptr = wrapper(exptr, seed)
+    return exptr
+
+  def _build_wrappers(
+      self, exptr: experimenter.Experimenter
+  ) -> list[_ExperimenterWrapper]:
+    """Returns the wrappers to apply to the base experimenter `exptr`."""
+    wrappers = []
     if self.shift is not None:
-      exptr = shifting_experimenter.ShiftingExperimenter(
-          exptr, shift=self.shift
+      wrappers.append(
+          lambda e, _: shifting_experimenter.ShiftingExperimenter(
+              e, shift=self.shift
+          )
       )
     if self.num_normalization_samples:
-      exptr = normalizing_experimenter.NormalizingExperimenter(
-          exptr, num_normalization_samples=self.num_normalization_samples
+      wrappers.append(
+          lambda e, _: normalizing_experimenter.NormalizingExperimenter(
+              e, num_normalization_samples=self.num_normalization_samples
+          )
       )
 
     # Discretization and categorization.
@@ -130,32 +172,34 @@ class SingleObjectiveExperimenterFactory(SerializableExperimenterFactory):
           f'{self.categorical_dict} categorical indices'
       )
 
+    # Shifting and normalization keep the parameter names, so they are read
+    # from the base experimenter.
     pcs = list(exptr.problem_statement().search_space.parameters)
+    create_with_grid = (
+        discretizing_experimenter.DiscretizingExperimenter.create_with_grid
+    )
     if self.discrete_dict:
       discretization = {
           pcs[idx].name: points for idx, points in self.discrete_dict.items()
       }
-      exptr = (
-          discretizing_experimenter.DiscretizingExperimenter.create_with_grid(
-              exptr, discretization, convert_to_str=False
-          )
+      wrappers.append(
+          lambda e, _: create_with_grid(e, discretization, convert_to_str=False)
       )
 
     if self.categorical_dict:
       categorization = {
           pcs[idx].name: points for idx, points in self.categorical_dict.items()
       }
-      exptr = (
-          discretizing_experimenter.DiscretizingExperimenter.create_with_grid(
-              exptr, categorization, convert_to_str=True
-          )
+      wrappers.append(
+          lambda e, _: create_with_grid(e, categorization, convert_to_str=True)
       )
     if self.noise_type is not None:
-      exptr = noisy_experimenter.NoisyExperimenter.from_type(
-          exptr, noise_type=self.noise_type.upper(), seed=seed
+      wrappers.append(
+          lambda e, seed: noisy_experimenter.NoisyExperimenter.from_type(
+              e, noise_type=self.noise_type.upper(), seed=seed
+          )
       )
-
-    return exptr
+    return wrappers
 
   def dump(self) -> vz.Metadata:
     # The resulting metadata stores base factory metadata
@@ -110,6 +110,11 @@ class ExperimenterFactoryTest(parameterized.TestCase):
     exptr.evaluate([t])
     self.assertEqual(t.status, pyvizier.TrialStatus.COMPLETED)
 
+    # Later calls reuse the wrappers built by the first one.
+    self.assertEqual(
+        exptr_factory().problem_statement(), exptr.problem_statement()
+    )
+
   def testSingleObjectiveFactoryError(self):
     dim = 4
     bbob_factory = experimenter_factory.BBOBExperimenterFactory(
@@ -0,0 +1,81 @@
+# Copyright 2023 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+
+"""PSD Kernel for computing kernel matrices in blocks of rows."""
+
+import jax
+import jax.numpy as jnp
+from tensorflow_probability.substrates import jax as tfp
+
+
+class ChunkedMatrix(tfp.math.psd_kernels.FeatureTransformed):
+  """Kernel computing its matrices `chunk_size` rows at a time.
+
+  Kernels such as `FeatureScaled(MaternFiveHalves())` materialize pairwise
+  differences of shape [N, M, D] to compute an [N, M] matrix. This kernel
+  computes the matrix in blocks of `chunk_size` rows with `jax.lax.map`, so the
+  intermediates are [chunk_size, M, D]. Each block is rematerialized in the
+  backward pass with `jax.checkpoint`, so the intermediates are not stored for
+  the gradients either. The values are the same as those of `kernel`.
+
+  Only matrices between unbatched, single-array inputs of a kernel without
+  batch shape are chunked; the others are computed by `kernel` directly.
+  """
+
+  def __init__(
+      self,
+      kernel: tfp.math.psd_kernels.PositiveSemidefiniteKernel,
+      chunk_size: int,
+  ):
+    self._kernel = kernel
+    self._chunk_size = chunk_size
+
+    super(ChunkedMatrix, self).__init__(
+        kernel, transformation_fn=lambda x, *_: x
+    )
+
+  @property
+  def kernel(self):
+    return self._kernel
+
+  @property
+  def chunk_size(self):
+    return self._chunk_size
+
+  def _batch_shape(self):
+    return self.kernel.batch_shape
+
+  def _batch_shape_tensor(self):
+    return self.kernel.batch_shape_tensor()
+
+  def _matrix(self, x1, x2):
+    if (
+        not isinstance(x1, jax.Array)
+        or x1.ndim != 2
+        or x1.shape[0] <= self._chunk_size
+        or self.kernel.batch_shape.rank != 0
+    ):
+      return self.kernel.matrix(x1, x2)
+    num_rows = x1.shape[0]
+    num_chunks = -(-num_rows // self._chunk_size)
+    # Padding rows are zeros, so that they have finite kernel values.
+    num_padding = num_chunks * self._chunk_size - num_rows
+    padded = jnp.pad(x1, ((0, num_padding), (0, 0)))
+    blocks = jax.lax.map(
+        jax.checkpoint(lambda rows: self.kernel.matrix(rows, x2)),
+        padded.reshape(num_chunks, self._chunk_size, x1.shape[1]),
+    )
+    return blocks.reshape(num_chunks * self._chunk_size, -1)[:num_rows]
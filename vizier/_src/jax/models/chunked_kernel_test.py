@@ -0,0 +1,52 @@
+# Copyright 2023 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+
+"""Tests for ChunkedMatrix."""
+
+from absl.testing import parameterized
+import jax
+import jax.numpy as jnp
+import numpy as np
+from tensorflow_probability.substrates import jax as tfp
+from vizier._src.jax.models import chunked_kernel
+
+from absl.testing import absltest
+
+tfpk = tfp.math.psd_kernels
+
+
+class ChunkedMatrixTest(parameterized.TestCase):
+
+  @parameterized.parameters(3, 4, 10, 20)
+  def testMatrixAndGradient(self, chunk_size):
+    x1 = np.random.randn(10, 3)
+    x2 = np.random.randn(7, 3)
+
+    def f(scale, chunked):
+      kernel = tfpk.FeatureScaled(tfpk.MaternFiveHalves(), scale_diag=scale)
+      if chunked:
+        kernel = chunked_kernel.ChunkedMatrix(kernel, chunk_size=chunk_size)
+      return jnp.sum(kernel.matrix(jnp.asarray(x1), jnp.asarray(x2)) ** 2)
+
+    scale = np.array([0.5, 1.0, 2.0])
+    value, grad = jax.value_and_grad(f)(scale, True)
+    expected_value, expected_grad = jax.value_and_grad(f)(scale, False)
+    np.testing.assert_allclose(value, expected_value, rtol=1e-5)
+    np.testing.assert_allclose(grad, expected_grad, rtol=1e-5)
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -18,7 +18,6 @@ from __future__ import annotations
 
 # TODO: Add Ax/BoTorch GP.
 
-import functools
 from typing import Any, Generator, Optional, Union
 
 import attr
@@ -29,6 +28,7 @@ import numpy as np
 from tensorflow_probability.substrates import jax as tfp
 from vizier._src.jax import stochastic_process_model as sp
 from vizier._src.jax import types
+from vizier._src.jax.models import chunked_kernel
 from vizier._src.jax.models import mask_features
 from vizier._src.jax.optimizers import optimizers
 
@@ -53,19 +53,111 @@ def _log_uniform_init(
     low: Parameter lower bound.
     high: Parameter upper bound.
     shape: Returned array has this shape. Each entry in the returned array is an
-      i.i.d sample.
+      i.i.d sample. The samples have the dtype of the bounds.
 
   Returns:
     Randomly sampled array.
   """
 
+  # The bounds are known here, so the logs are computed once on the host.
+  log_low = np.log(low)
+  log_ratio = np.log(high / low)
+  dtype = np.asarray(low).dtype
+
   def sample(key: Any) -> jnp.ndarray:
-    unif = jnp.array(jax.random.uniform(key, shape, dtype=jnp.float64))
-    return jnp.exp(unif * jnp.log(high / low) + jnp.log(low))
+    unif = jax.random.uniform(key, shape, dtype=dtype)
+    return jnp.exp(unif * log_ratio + log_low)
 
   return sample
 
 
+# Initial diagonal jitter and maximum number of retries of the Cholesky
+# decomposition, when it fails.
+_CHOLESKY_JITTER = 1e-4
+_CHOLESKY_MAX_RETRIES = 5
+
+
+def _retrying_cholesky(matrix: jax.Array) -> jax.Array:
+  """Cholesky factor of `matrix`, adding diagonal jitter if it fails.
+
+  The jitter starts at `_CHOLESKY_JITTER` and is multiplied by 10 on each of up
+  to `_CHOLESKY_MAX_RETRIES` retries. On CPU, the retries run sequentially in a
+  while loop. On accelerators, all the jitters of the schedule are tried at
+  once with a single batched decomposition, and the smallest one that succeeds
+  is factorized again to carry the gradients.
+
+  Args:
+    matrix: Symmetric matrices of shape [..., N, N].
+
+  Returns:
+    Lower triangular factors, NaN for the matrices whose decomposition failed
+    with all the jitters. They have the dtype of `matrix`, but are computed in
+    float64.
+  """
+  dtype = matrix.dtype
+  matrix = matrix.astype(np.float64)
+  if jax.default_backend() == 'cpu':
+    return tfp.experimental.distributions.marginal_fns.retrying_cholesky(
+        matrix,
+        jitter=np.asarray(_CHOLESKY_JITTER, matrix.dtype),
+        max_iters=_CHOLESKY_MAX_RETRIES,
+    )[0].astype(dtype)
+  shifts = np.concatenate([
+      [0.0],
+      _CHOLESKY_JITTER * 10.0 ** np.arange(_CHOLESKY_MAX_RETRIES),
+  ]).astype(matrix.dtype)
+  eye = jnp.eye(matrix.shape[-1], dtype=matrix.dtype)
+  # The jitter choice has no gradient, as in TFP's `retrying_cholesky`.
+  stopped_matrix = jax.lax.stop_gradient(matrix)
+  factors = jnp.linalg.cholesky(
+      stopped_matrix[..., jnp.newaxis, :, :] + shifts[:, None, None] * eye
+  )
+  succeeded = ~jnp.isnan(factors[..., 0, 0])
+  # Falls back to the largest jitter if all of them fail, giving NaN.
+  index = jnp.where(
+      jnp.any(succeeded, axis=-1),
+      jnp.argmax(succeeded, axis=-1),
+      len(shifts) - 1,
+  )
+  shift = jnp.asarray(shifts)[index]
+  return jnp.linalg.cholesky(matrix + shift[..., None, None] * eye).astype(
+      dtype
+  )
+
+
+def _interval_bijector(low: Any, high: Any) -> tfb.Bijector:
+  """Returns a bijector from the real line to the interval (low, high).
+
+  A scaled and shifted sigmoid is cheaper than `tfb.SoftClip`, which evaluates
+  several softplus functions, and its inverse and log-determinant are analytic.
+
+  Args:
+    low: Lower bound of the interval.
+    high: Upper bound of the interval.
+  """
+  return tfb.Sigmoid(low=low, high=high)
+
+
+def batched_loss_fn(
+    loss_fn: optimizers.LossFunction,
+) -> optimizers.LossFunction:
+  """Returns `loss_fn` vectorized over a leading axis of the parameters.
+
+  The leading axis indexes parameter sets, e.g. random restarts or ensemble
+  members, not examples: each parameter set still builds and factorizes its own
+  kernel matrix over all the examples, but all of them are evaluated by a single
+  compiled computation. Parameter sets can be stacked with
+  `jax.tree_util.tree_map(lambda *x: jnp.stack(x), *params)`.
+
+  Args:
+    loss_fn: Loss function returned by `model_and_loss_fn`.
+
+  Returns:
+    Loss function of the stacked parameters, returning stacked losses.
+  """
+  return jax.jit(jax.vmap(loss_fn))
+
+
 @attr.define
 class VizierGaussianProcess(
     sp.ModelCoroutine[types.Array, tfd.GaussianProcess]
@@ -77,8 +169,15 @@ class VizierGaussianProcess(
   Attributes:
     _boundary_epsilon: We expand the constraints by this number so that the
       values exactly at the boundary can be mapped to unconstrained space. i.e.
-      we are trying to avoid SoftClip(low=1e-2, high=1.).inverse(1e-2) giving
-      NaN.
+      we are trying to avoid Sigmoid(low=1e-2, high=1.).inverse(1e-2) giving
+      -inf.
+    _kernel_chunk_size: If set, the kernel matrices are computed this many rows
+      at a time, which bounds the memory of their intermediates for large
+      numbers of examples.
+    _dtype: Dtype of the parameters and of the features, and hence of the
+      kernel matrix. It may be lowered to `np.float32` to speed up the kernel
+      matrix computation; the Cholesky decomposition is always computed in
+      float64.
   """
 
   _feature_dim: int
@@ -86,7 +185,63 @@ class VizierGaussianProcess(
   _dimension_is_missing: Optional[types.Array] = attr.field(
       default=None, kw_only=True
   )
+  _kernel_chunk_size: Optional[int] = attr.field(default=None, kw_only=True)
+  _dtype: Any = attr.field(default=np.float64, kw_only=True)
   _boundary_epsilon: float = attr.field(default=1e-12, kw_only=True)
+  # Model parameters, built once from the fields above since they do not depend
+  # on the inputs or the parameter values.
+  _amplitude: sp.ModelParameter = attr.field(init=False, repr=False, eq=False)
+  _length_scale: sp.ModelParameter = attr.field(
+      init=False, repr=False, eq=False
+  )
+  _observation_noise_variance: sp.ModelParameter = attr.field(
+      init=False, repr=False, eq=False
+  )
+
+  def __attrs_post_init__(self):
+    eps = self._boundary_epsilon
+    dtype = np.dtype(self._dtype).type
+    observation_noise_bounds = (dtype(1e-10 - eps), dtype(1.0 + eps))
+    amplitude_bounds = (
+        dtype(np.sqrt(1e-3) - eps),
+        dtype(np.sqrt(10.0) + eps),
+    )
+    ones = np.ones((self._feature_dim,), dtype=dtype)
+    length_scale_bounds = (ones * (1e-1 - eps), ones * 1e1 + eps)
+
+    # The regularizers of the amplitude and length scales equal those of their
+    # squares, i.e. of the signal variance and the squared length scales.
+    self._amplitude = sp.ModelParameter(
+        init_fn=_log_uniform_init(*amplitude_bounds),
+        constraint=sp.Constraint(
+            amplitude_bounds,
+            _interval_bijector(*amplitude_bounds),
+        ),
+        regularizer=lambda x: 0.04 * jnp.square(jnp.log(x / 0.039**0.5)),
+        name='amplitude',
+    )
+    self._length_scale = sp.ModelParameter(
+        init_fn=_log_uniform_init(
+            *length_scale_bounds, shape=(self._feature_dim,)
+        ),
+        constraint=sp.Constraint(
+            length_scale_bounds,
+            _interval_bijector(*length_scale_bounds),
+        ),
+        regularizer=lambda x: jnp.sum(
+            0.04 * jnp.square(jnp.log(x / 0.5**0.5))
+        ),
+        name='length_scale',
+    )
+    self._observation_noise_variance = sp.ModelParameter(
+        init_fn=_log_uniform_init(*observation_noise_bounds),
+        constraint=sp.Constraint(
+            observation_noise_bounds,
+            _interval_bijector(*observation_noise_bounds),
+        ),
+        regularizer=lambda x: 0.01 * jnp.square(jnp.log(x / 0.0039)),
+        name='observation_noise_variance',
+    )
 
   @classmethod
   def model_and_loss_fn(
@@ -97,26 +252,37 @@ class VizierGaussianProcess(
       dimension_is_missing: Optional[types.Array] = None,
       observation_is_missing: Optional[types.Array] = None,
       use_retrying_cholesky: bool = True,
+      kernel_chunk_size: Optional[int] = None,
+      dtype: Any = np.float64,
   ) -> tuple[sp.StochasticProcessModel, optimizers.LossFunction]:
     """Returns the model and loss function."""
     gp_coroutine = VizierGaussianProcess(
         features.shape[-1],
         dimension_is_missing=dimension_is_missing,
         use_retrying_cholesky=use_retrying_cholesky,
+        kernel_chunk_size=kernel_chunk_size,
+        dtype=dtype,
     )
     model = sp.StochasticProcessModel(gp_coroutine)
 
     # Run ARD.
     def loss_fn(params):
-      gp, mutables = model.apply({'params': params},
-                                 features,
-                                 mutable=['losses', 'predictive'])
-      loss = -gp.log_prob(
-          labels, is_missing=observation_is_missing
-      ) + jax.tree_util.tree_reduce(jax.numpy.add, mutables['losses'])
+      gp, mutables = model.apply(
+          {'params': params}, features, mutable=['losses']
+      )
+      # The regularization losses are scalars, summed in a single reduction.
+      regularization = jnp.sum(
+          jnp.stack(jax.tree_util.tree_leaves(mutables['losses']))
+      )
+      loss = (
+          -gp.log_prob(labels, is_missing=observation_is_missing)
+          + regularization
+      )
       return loss, dict()
 
-    return model, loss_fn
+    # `features` and `labels` are closed over, so the loss is compiled once
+    # per parameter structure.
+    return model, jax.jit(loss_fn)
 
   def __call__(
       self, inputs: Optional[types.Array] = None
@@ -129,36 +295,11 @@ class VizierGaussianProcess(
     Yields:
       GaussianProcess whose event shape is `num_examples`.
     """
+    amplitude = yield self._amplitude
+    kernel = tfpk.MaternFiveHalves(amplitude=amplitude)
 
-    eps = self._boundary_epsilon
-    observation_noise_bounds = (np.float64(1e-10 - eps), 1.0 + eps)
-    amplitude_bounds = (np.float64(1e-3 - eps), 10.0 + eps)
-    ones = np.ones((self._feature_dim,), dtype=np.float64)
-    length_scale_bounds = (ones * (1e-2 - eps), ones * 1e2 + eps)
-
-    signal_variance = yield sp.ModelParameter(
-        init_fn=_log_uniform_init(*amplitude_bounds),
-        constraint=sp.Constraint(
-            amplitude_bounds,
-            tfb.SoftClip(*amplitude_bounds, hinge_softness=1e-2),
-        ),
-        regularizer=lambda x: 0.01 * jnp.log(x / 0.039) ** 2,
-        name='signal_variance',
-    )
-    kernel = tfpk.MaternFiveHalves(amplitude=jnp.sqrt(signal_variance))
-
-    length_scale = yield sp.ModelParameter(
-        init_fn=_log_uniform_init(
-            *length_scale_bounds, shape=(self._feature_dim,)
-        ),
-        constraint=sp.Constraint(
-            length_scale_bounds,
-            tfb.SoftClip(*length_scale_bounds, hinge_softness=1e-2),
-        ),
-        regularizer=lambda x: jnp.sum(0.01 * jnp.log(x / 0.5) ** 2),
-        name='length_scale_squared',
-    )
-    kernel = tfpk.FeatureScaled(kernel, scale_diag=jnp.sqrt(length_scale))
+    length_scale = yield self._length_scale
+    kernel = tfpk.FeatureScaled(kernel, scale_diag=length_scale)
     if self._dimension_is_missing is not None:
       # Ensure features are zero for this kernel. This will also ensure the
       # length scales are not trainable, since there will be no signal from
@@ -166,26 +307,20 @@ class VizierGaussianProcess(
       kernel = mask_features.MaskFeatures(
           kernel, dimension_is_missing=self._dimension_is_missing
       )
+    if self._kernel_chunk_size is not None:
+      kernel = chunked_kernel.ChunkedMatrix(
+          kernel, chunk_size=self._kernel_chunk_size
+      )
 
-    observation_noise_variance = yield sp.ModelParameter(
-        init_fn=_log_uniform_init(*observation_noise_bounds),
-        constraint=sp.Constraint(
-            observation_noise_bounds,
-            tfb.SoftClip(*observation_noise_bounds, hinge_softness=1e-2),
-        ),
-        regularizer=lambda x: 0.01 * jnp.log(x / 0.0039) ** 2,
-        name='observation_noise_variance',
-    )
+    observation_noise_variance = yield self._observation_noise_variance
 
     cholesky_fn = None
     # When cholesky fails, increase jitters and retry.
     if self._use_retrying_cholesky:
-      retrying_cholesky = functools.partial(
-          tfp.experimental.distributions.marginal_fns.retrying_cholesky,
-          jitter=np.float64(1e-4),
-          max_iters=5,
-      )
-      cholesky_fn = lambda matrix: retrying_cholesky(matrix)[0]
+      cholesky_fn = _retrying_cholesky
+
+    if inputs is not None:
+      inputs = jnp.asarray(inputs, dtype=self._dtype)
 
     return tfd.GaussianProcess(
         kernel,
@@ -207,14 +342,94 @@ class VizierGaussianProcessWithCategorical(
   Attributes:
     _boundary_epsilon: We expand the constraints by this number so that the
       values exactly at the boundary can be mapped to unconstrained space. i.e.
-      we are trying to avoid SoftClip(low=1e-2, high=1.).inverse(1e-2) giving
-      NaN.
+      we are trying to avoid Sigmoid(low=1e-2, high=1.).inverse(1e-2) giving
+      -inf.
+    _dtype: Dtype of the parameters and of the continuous features, and hence
+      of the kernel matrix. It may be lowered to `np.float32` to speed up the
+      kernel matrix computation; the Cholesky decomposition is always computed
+      in float64.
   """
 
   _continuous_dim: int
   _categorical_dim: int
   _use_retrying_cholesky: bool = attr.field(default=True, kw_only=True)
   _boundary_epsilon: float = attr.field(default=1e-12, kw_only=True)
+  _dtype: Any = attr.field(default=np.float64, kw_only=True)
+  # Model parameters, built once from the fields above since they do not depend
+  # on the inputs or the parameter values.
+  _amplitude: sp.ModelParameter = attr.field(init=False, repr=False, eq=False)
+  _continuous_length_scale: sp.ModelParameter = attr.field(
+      init=False, repr=False, eq=False
+  )
+  _categorical_length_scale: sp.ModelParameter = attr.field(
+      init=False, repr=False, eq=False
+  )
+  _observation_noise_variance: sp.ModelParameter = attr.field(
+      init=False, repr=False, eq=False
+  )
+
+  def __attrs_post_init__(self):
+    eps = self._boundary_epsilon
+    dtype = np.dtype(self._dtype).type
+    observation_noise_bounds = (dtype(1e-10 - eps), dtype(1.0 + eps))
+    amplitude_bounds = (
+        dtype(np.sqrt(1e-3) - eps),
+        dtype(np.sqrt(10.0) + eps),
+    )
+    continuous_ones = np.ones((self._continuous_dim), dtype=dtype)
+    continuous_length_scale_bounds = (
+        continuous_ones * (1e-2 - eps),
+        continuous_ones * 1e2 + eps,
+    )
+    categorical_ones = np.ones((self._categorical_dim), dtype=dtype)
+    categorical_length_scale_bounds = (
+        categorical_ones * (1e-2 - eps),
+        categorical_ones * 1e2 + eps,
+    )
+
+    # The regularizer of the amplitude equals that of its square, the signal
+    # variance.
+    self._amplitude = sp.ModelParameter(
+        init_fn=_log_uniform_init(*amplitude_bounds),
+        constraint=sp.Constraint(
+            amplitude_bounds,
+            _interval_bijector(*amplitude_bounds),
+        ),
+        regularizer=lambda x: 0.04 * jnp.square(jnp.log(x / 0.039**0.5)),
+        name='amplitude',
+    )
+    self._continuous_length_scale = sp.ModelParameter(
+        init_fn=_log_uniform_init(
+            *continuous_length_scale_bounds, shape=(self._continuous_dim,)
+        ),
+        constraint=sp.Constraint(
+            continuous_length_scale_bounds,
+            _interval_bijector(*continuous_length_scale_bounds),
+        ),
+        regularizer=lambda x: 0.01 * jnp.sum(jnp.square(jnp.log(x / 0.5))),
+        name='continuous_length_scale_squared',
+    )
+    self._categorical_length_scale = sp.ModelParameter(
+        init_fn=_log_uniform_init(
+            *categorical_length_scale_bounds,
+            shape=(self._categorical_dim,),
+        ),
+        constraint=sp.Constraint(
+            categorical_length_scale_bounds,
+            _interval_bijector(*categorical_length_scale_bounds),
+        ),
+        regularizer=lambda x: 0.01 * jnp.sum(jnp.square(jnp.log(x / 0.5))),
+        name='categorical_length_scale_squared',
+    )
+    self._observation_noise_variance = sp.ModelParameter(
+        init_fn=_log_uniform_init(*observation_noise_bounds),
+        constraint=sp.Constraint(
+            observation_noise_bounds,
+            _interval_bijector(*observation_noise_bounds),
+        ),
+        regularizer=lambda x: 0.01 * jnp.square(jnp.log(x / 0.0039)),
+        name='observation_noise_variance',
+    )
 
   @classmethod
   def model_and_loss_fn(
@@ -226,27 +441,33 @@ class VizierGaussianProcessWithCategorical(
           types.ContinuousAndCategoricalArray
       ] = None,
       use_retrying_cholesky: bool = True,
+      dtype: Any = np.float64,
   ) -> tuple[sp.StochasticProcessModel, optimizers.LossFunction]:
     """Returns the model and loss function."""
     gp_coroutine = VizierGaussianProcessWithCategorical(
         continuous_dim=features.continuous.shape[-1],
         categorical_dim=features.categorical.shape[-1],
         use_retrying_cholesky=use_retrying_cholesky,
+        dtype=dtype,
     )
     model = sp.StochasticProcessModel(gp_coroutine)
 
     # Run ARD.
     def loss_fn(params):
       gp, mutables = model.apply(
-          {'params': params}, features, mutable=['losses', 'predictive']
+          {'params': params}, features, mutable=['losses']
       )
-      loss = -gp.log_prob(labels) + jax.tree_util.tree_reduce(
-          jax.numpy.add, mutables['losses']
+      # The regularization losses are scalars, summed in a single reduction.
+      regularization = jnp.sum(
+          jnp.stack(jax.tree_util.tree_leaves(mutables['losses']))
       )
+      loss = -gp.log_prob(labels) + regularization
 
       return loss, dict()
 
-    return model, loss_fn
+    # `features` and `labels` are closed over, so the loss is compiled once
+    # per parameter structure.
+    return model, jax.jit(loss_fn)
 
   def __call__(
       self, inputs: Optional[types.ContinuousAndCategoricalArray] = None
@@ -260,54 +481,11 @@ class VizierGaussianProcessWithCategorical(
     Yields:
       GaussianProcess whose event shape is `num_examples`.
     """
-    eps = self._boundary_epsilon
-    observation_noise_bounds = (np.float64(1e-10 - eps), 1.0 + eps)
-    amplitude_bounds = (np.float64(1e-3 - eps), 10.0 + eps)
-    continuous_ones = np.ones((self._continuous_dim), dtype=np.float64)
-    continuous_length_scale_bounds = (
-        continuous_ones * (1e-2 - eps),
-        continuous_ones * 1e2 + eps,
-    )
-    categorical_ones = np.ones((self._categorical_dim), dtype=np.float64)
-    categorical_length_scale_bounds = (
-        categorical_ones * (1e-2 - eps),
-        categorical_ones * 1e2 + eps,
-    )
+    amplitude = yield self._amplitude
+    kernel = tfpk.MaternFiveHalves(amplitude=amplitude)
 
-    signal_variance = yield sp.ModelParameter(
-        init_fn=_log_uniform_init(*amplitude_bounds),
-        constraint=sp.Constraint(
-            amplitude_bounds,
-            tfb.SoftClip(*amplitude_bounds, hinge_softness=1e-2),
-        ),
-        regularizer=lambda x: 0.01 * jnp.log(x / 0.039) ** 2,
-        name='signal_variance',
-    )
-    kernel = tfpk.MaternFiveHalves(amplitude=jnp.sqrt(signal_variance))
-
-    continuous_length_scale = yield sp.ModelParameter(
-        init_fn=_log_uniform_init(
-            *continuous_length_scale_bounds, shape=(self._continuous_dim,)
-        ),
-        constraint=sp.Constraint(
-            continuous_length_scale_bounds,
-            tfb.SoftClip(*continuous_length_scale_bounds, hinge_softness=1e-2),
-        ),
-        regularizer=lambda x: jnp.sum(0.01 * jnp.log(x / 0.5) ** 2),
-        name='continuous_length_scale_squared',
-    )
-    categorical_length_scale = yield sp.ModelParameter(
-        init_fn=_log_uniform_init(
-            *categorical_length_scale_bounds,
-            shape=(self._categorical_dim,),
-        ),
-        constraint=sp.Constraint(
-            categorical_length_scale_bounds,
-            tfb.SoftClip(*categorical_length_scale_bounds, hinge_softness=1e-2),
-        ),
-        regularizer=lambda x: jnp.sum(0.01 * jnp.log(x / 0.5) ** 2),
-        name='categorical_length_scale_squared',
-    )
+    continuous_length_scale = yield self._continuous_length_scale
+    categorical_length_scale = yield self._categorical_length_scale
     kernel = tfpke.FeatureScaledWithCategorical(
         kernel,
         scale_diag=tfpke.ContinuousAndCategoricalValues(
@@ -315,28 +493,16 @@ class VizierGaussianProcessWithCategorical(
         ),
     )
 
-    observation_noise_variance = yield sp.ModelParameter(
-        init_fn=_log_uniform_init(*observation_noise_bounds),
-        constraint=sp.Constraint(
-            observation_noise_bounds,
-            tfb.SoftClip(*observation_noise_bounds, hinge_softness=1e-2),
-        ),
-        regularizer=lambda x: 0.01 * jnp.log(x / 0.0039) ** 2,
-        name='observation_noise_variance',
-    )
+    observation_noise_variance = yield self._observation_noise_variance
     cholesky_fn = None
     # When cholesky fails, increase jitters and retry.
     if self._use_retrying_cholesky:
-      retrying_cholesky = functools.partial(
-          tfp.experimental.distributions.marginal_fns.retrying_cholesky,
-          jitter=np.float64(1e-4),
-          max_iters=5,
-      )
-      cholesky_fn = lambda matrix: retrying_cholesky(matrix)[0]
+      cholesky_fn = _retrying_cholesky
 
     if inputs is not None:
       inputs = tfpke.ContinuousAndCategoricalValues(
-          continuous=inputs.continuous, categorical=inputs.categorical
+          continuous=jnp.asarray(inputs.continuous, dtype=self._dtype),
+          categorical=inputs.categorical,
       )
 
     return tfd.GaussianProcess(
@@ -16,8 +16,11 @@ from __future__ import annotations
 
 """Tests for tuned_gp_models."""
 
+from unittest import mock
+
 from absl import logging
 import jax
+from jax import numpy as jnp
 import numpy as np
 from tensorflow_probability.substrates import jax as tfp
 from vizier._src.jax import stochastic_process_model as sp
@@ -201,6 +204,67 @@ class VizierGpTest(absltest.TestCase):
     logging.info('Loss: %s', loss_fn(optimal_params)[0])
     self.assertLess(metrics['loss'].min(), target_loss)
 
+  def test_batched_loss_fn(self):
+    x_obs, y_obs = self._generate_xys()
+    model, loss_fn = tuned_gp_models.VizierGaussianProcess.model_and_loss_fn(
+        x_obs, y_obs
+    )
+    params = [
+        model.init(rng, x_obs)['params']
+        for rng in jax.random.split(jax.random.PRNGKey(0), 3)
+    ]
+    stacked_params = jax.tree_util.tree_map(lambda *x: np.stack(x), *params)
+    losses, _ = tuned_gp_models.batched_loss_fn(loss_fn)(stacked_params)
+    np.testing.assert_allclose(
+        losses, [loss_fn(p)[0] for p in params], rtol=1e-10
+    )
+
+  def test_retrying_cholesky_batched_jitters(self):
+    x = np.linspace(0.0, 1.0, 5)
+    # Rank one, so the decomposition fails without jitter.
+    singular = np.outer(x, x) + np.eye(5) * 1e-20
+    for matrix in (np.eye(5) + 0.5 * np.outer(x, x), singular):
+      loss = lambda m: jnp.sum(tuned_gp_models._retrying_cholesky(m))
+      expected, expected_grad = jax.value_and_grad(loss)(matrix)
+      with mock.patch.object(jax, 'default_backend', return_value='gpu'):
+        actual, actual_grad = jax.value_and_grad(loss)(matrix)
+      np.testing.assert_allclose(actual, expected, rtol=1e-10)
+      np.testing.assert_allclose(actual_grad, expected_grad, rtol=1e-6)
+
+  def test_float32_kernel(self):
+    x_obs, y_obs = self._generate_xys()
+    model, loss_fn = tuned_gp_models.VizierGaussianProcess.model_and_loss_fn(
+        x_obs, y_obs
+    )
+    params = model.init(jax.random.PRNGKey(0), x_obs)['params']
+    model32, loss_fn32 = (
+        tuned_gp_models.VizierGaussianProcess.model_and_loss_fn(
+            x_obs, y_obs, dtype=np.float32
+        )
+    )
+    params32 = model32.init(jax.random.PRNGKey(0), x_obs)['params']
+    self.assertEqual(params32['length_scale'].dtype, np.float32)
+    loss32, _ = loss_fn32(
+        jax.tree_util.tree_map(lambda x: x.astype(np.float32), params)
+    )
+    self.assertEqual(loss32.dtype, np.float32)
+    np.testing.assert_allclose(loss32, loss_fn(params)[0], rtol=1e-4)
+
+  def test_kernel_chunk_size(self):
+    x_obs, y_obs = self._generate_xys()
+    model, loss_fn = tuned_gp_models.VizierGaussianProcess.model_and_loss_fn(
+        x_obs, y_obs
+    )
+    _, chunked_loss_fn = (
+        tuned_gp_models.VizierGaussianProcess.model_and_loss_fn(
+            x_obs, y_obs, kernel_chunk_size=3
+        )
+    )
+    params = model.init(jax.random.PRNGKey(0), x_obs)['params']
+    np.testing.assert_allclose(
+        chunked_loss_fn(params)[0], loss_fn(params)[0], rtol=1e-10
+    )
+
   def test_good_log_likelihood_with_masks(self):
     x_obs, y_obs = self._generate_xys()
     # Pad x_s and y_s and generate masks.
@@ -16,14 +16,17 @@ from __future__ import annotations
 
 """A Vizier Ray Searcher."""
 
+import collections
 import datetime
 import json
+import time
 from typing import Dict, Optional
 import uuid
 
 from ray import tune
 from ray.tune import search
 from vizier._src.raytune import converters
+from vizier.client import client_abc
 from vizier.service import clients
 from vizier.service import pyvizier as svz
 
@@ -36,6 +39,7 @@ class VizierSearch(search.Searcher):
       study_id: Optional[str] = None,
       problem: Optional[svz.StudyConfig] = None,
       algorithm: Optional[str] = 'GAUSSIAN_PROCESS_BANDIT',
+      suggestion_batch_size: int = 1,
       **kwargs,
   ):
     """Initialize a Searcher via ProblemStatement.
@@ -46,6 +50,10 @@ class VizierSearch(search.Searcher):
       study_id: The study id in the Vizier service.
       problem: The study config to optimize over.
       algorithm: The Vizier algorithm to use.
+      suggestion_batch_size: Number of trials requested from the Vizier service
+        at once. The trials not used yet are queued for the next suggestions,
+        which saves service round trips for fast trainables but lets the
+        algorithm see fewer results before suggesting them.
       **kwargs:
     """
     super().__init__(**kwargs)
@@ -56,9 +64,17 @@ class VizierSearch(search.Searcher):
       self.study_id = f'ray_vizier_{uuid.uuid1()}'
 
     self.algorithm = algorithm
+    self._suggestion_batch_size = suggestion_batch_size
+    # Trials suggested by the Vizier service, but not yet given to Ray.
+    self._suggestion_queue: collections.deque[clients.Trial] = (
+        collections.deque()
+    )
 
     # Mapping from Ray trial id to Vizier Trial client.
     self._active_trials: Dict[str, clients.Trial] = {}
+    # Mapping from Ray trial id to the `time.monotonic()` at which its Vizier
+    # Trial started, so elapsed times need no trial lookup in the service.
+    self._trial_start_times: Dict[str, float] = {}
 
     # The name of the metric being optimized, for single objective studies.
     self._metric = None
@@ -127,12 +143,8 @@ class VizierSearch(search.Searcher):
     if trial_id not in self._active_trials:
       raise RuntimeError(f'No active trial for {trial_id}')
     trial_client = self._active_trials[trial_id]
-    elapsed_secs = (
-        datetime.datetime.now().astimezone()
-        - trial_client.materialize().creation_time
-    )
     trial_client.add_measurement(
-        svz.Measurement(result, elapsed_secs=elapsed_secs.total_seconds())
+        svz.Measurement(result, elapsed_secs=self._elapsed_secs(trial_id))
     )
 
   def on_trial_complete(
@@ -150,33 +162,36 @@ class VizierSearch(search.Searcher):
     else:
       measurement = None
       if result:
-        elapsed_secs = (
-            datetime.datetime.now().astimezone()
-            - trial_client.materialize().creation_time
-        )
         measurement = svz.Measurement(
-            result, elapsed_secs=elapsed_secs.total_seconds()
+            result, elapsed_secs=self._elapsed_secs(trial_id)
         )
       trial_client.complete(measurement=measurement)
 
+  def _elapsed_secs(self, trial_id: str) -> float:
+    return time.monotonic() - self._trial_start_times[trial_id]
+
   def suggest(self, trial_id):
     if self.study_client is None:
       raise RuntimeError(
           'VizierSearch not initialized! Set a search space first.'
       )
-    suggestions = self.study_client.suggest(count=1)
-    if not suggestions:
+    if not self._suggestion_queue:
+      self._suggestion_queue.extend(
+          self.study_client.suggest(count=self._suggestion_batch_size)
+      )
+    if not self._suggestion_queue:
       return search.Searcher.FINISHED
 
-    self._active_trials[trial_id] = suggestions[0]
+    self._active_trials[trial_id] = self._suggestion_queue.popleft()
+    self._trial_start_times[trial_id] = time.monotonic()
     return self._active_trials[trial_id].parameters
 
-  # TODO: Test save and restore.
   def save(self, checkpoint_path):
     # We assume that the Vizier service continues running, so the only
     # information needed to restore this searcher is the mapping from the Ray
-    # to Vizier trial ids. All other information can become stale and is best
-    # restored from the Vizier service in restore().
+    # to Vizier trial ids and the ids of the queued Vizier trials. All other
+    # information can become stale and is best restored from the Vizier service
+    # in restore().
     ray_to_vizier_trial_ids = {}
     for trial_id, trial_client in self._active_trials.items():
       ray_to_vizier_trial_ids[trial_id] = trial_client.id
@@ -185,6 +200,9 @@ class VizierSearch(search.Searcher):
           {
               'study_id': self.study_id,
               'ray_to_vizier_trial_ids': ray_to_vizier_trial_ids,
+              'queued_vizier_trial_ids': [
+                  t.id for t in self._suggestion_queue
+              ],
           },
           f,
       )
@@ -200,6 +218,37 @@ class VizierSearch(search.Searcher):
     self._metric = (
         self.study_client.materialize_study_config().metric_information.item()
     )
+    # Fetch all the checkpointed trials with a single service call.
+    ray_to_vizier_trial_ids = obj['ray_to_vizier_trial_ids']
+    # Checkpoints written before the suggestion queue have no queued trials.
+    queued_vizier_trial_ids = obj.get('queued_vizier_trial_ids', [])
+    trials = self.study_client.trials(
+        svz.TrialFilter(
+            ids=[*ray_to_vizier_trial_ids.values(), *queued_vizier_trial_ids]
+        )
+    )
+    trial_clients = {t.id: t for t in trials}
+    creation_times = {t.id: t.creation_time for t in trials.get()}
+
+    def get_trial_client(vizier_trial_id: int) -> clients.Trial:
+      if vizier_trial_id not in trial_clients:
+        raise client_abc.ResourceNotFoundError(
+            f'Study {self.study_id} does not have Trial {vizier_trial_id}.'
+        )
+      return trial_clients[vizier_trial_id]
+
+    # The queued trials are still ACTIVE in the service, so they are given to
+    # Ray before new ones are suggested.
+    self._suggestion_queue = collections.deque(
+        get_trial_client(vizier_trial_id)
+        for vizier_trial_id in queued_vizier_trial_ids
+    )
     self._active_trials = {}
-    for ray_id, vizier_trial_id in obj['ray_to_vizier_trial_ids'].items():
-      self._active_trials[ray_id] = self.study_client.get_trial(vizier_trial_id)
+    self._trial_start_times = {}
+    now = datetime.datetime.now().astimezone()
+    for ray_id, vizier_trial_id in ray_to_vizier_trial_ids.items():
+      self._active_trials[ray_id] = get_trial_client(vizier_trial_id)
+      # The monotonic clock is process-local, so the start times are restored
+      # from the trials' creation times.
+      age = now - creation_times[vizier_trial_id]
+      self._trial_start_times[ray_id] = time.monotonic() - age.total_seconds()
@@ -15,10 +15,13 @@
 from __future__ import annotations
 
 """Test for VizierSearch. Cannot be tested internally but can be on GitHub."""
+import json
+
 from ray import tune
 from vizier._src.raytune import converters
 from vizier._src.raytune import vizier_search
 from vizier.benchmarks import experimenters
+from vizier.client import client_abc
 from vizier.service import clients
 from vizier.service import pyvizier as vz
 
@@ -66,6 +69,78 @@ class VizierSearchTest(absltest.TestCase):
     tuner.fit()
     self.assertLen(tuner.get_results(), 10)
 
+  def test_search_with_suggestion_batch_size(self):
+    dim = 4
+    bbob_factory = experimenters.BBOBExperimenterFactory(name='Sphere', dim=dim)
+    exptr = bbob_factory()
+
+    study_config = vz.StudyConfig.from_problem(exptr.problem_statement())
+    study_config.algorithm = 'RANDOM_SEARCH'
+    searcher = vizier_search.VizierSearch(
+        'test batch study', study_config, suggestion_batch_size=4
+    )
+
+    trainable = converters.ExperimenterConverter.to_callable(exptr)
+    tuner = tune.Tuner(
+        trainable,
+        param_space=None,
+        tune_config=tune.TuneConfig(num_samples=10, search_alg=searcher),
+    )
+    tuner.fit()
+    self.assertLen(tuner.get_results(), 10)
+
+  def test_save_and_restore_queued_suggestions(self):
+    bbob_factory = experimenters.BBOBExperimenterFactory(name='Sphere', dim=4)
+    study_config = vz.StudyConfig.from_problem(
+        bbob_factory().problem_statement()
+    )
+    study_config.algorithm = 'RANDOM_SEARCH'
+    searcher = vizier_search.VizierSearch(
+        'test restore study', study_config, suggestion_batch_size=4
+    )
+    parameters = searcher.suggest('ray_trial_0')
+    queued_ids = [t.id for t in searcher._suggestion_queue]
+    self.assertLen(queued_ids, 3)
+
+    checkpoint_path = self.create_tempfile().full_path
+    searcher.save(checkpoint_path)
+    restored = vizier_search.VizierSearch()
+    restored.restore(checkpoint_path)
+
+    self.assertEqual([t.id for t in restored._suggestion_queue], queued_ids)
+    self.assertEqual(
+        restored._active_trials['ray_trial_0'].id,
+        searcher._active_trials['ray_trial_0'].id,
+    )
+    # The queued trials are suggested before any new trial.
+    for i, queued_id in enumerate(queued_ids, start=1):
+      restored.suggest(f'ray_trial_{i}')
+      self.assertEqual(restored._active_trials[f'ray_trial_{i}'].id, queued_id)
+    self.assertEqual(
+        restored._active_trials['ray_trial_0'].parameters, parameters
+    )
+
+  def test_restore_missing_trial(self):
+    bbob_factory = experimenters.BBOBExperimenterFactory(name='Sphere', dim=4)
+    study_config = vz.StudyConfig.from_problem(
+        bbob_factory().problem_statement()
+    )
+    study_config.algorithm = 'RANDOM_SEARCH'
+    searcher = vizier_search.VizierSearch('test missing study', study_config)
+    searcher.suggest('ray_trial_0')
+
+    checkpoint_path = self.create_tempfile().full_path
+    searcher.save(checkpoint_path)
+    with open(checkpoint_path, 'r') as f:
+      obj = json.load(f)
+    obj['queued_vizier_trial_ids'] = [1000]
+    with open(checkpoint_path, 'w') as f:
+      json.dump(obj, f)
+
+    restored = vizier_search.VizierSearch()
+    with self.assertRaises(client_abc.ResourceNotFoundError):
+      restored.restore(checkpoint_path)
+
 
 if __name__ == '__main__':
   absltest.main()